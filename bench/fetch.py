@@ -0,0 +1,125 @@
+"""
+Benchmarks fetching a whole history (api.fetch_history, the fetch behind get_lphistory)
+against the local mock server for several concurrency settings, offline and
+reproducibly. Nothing is written to the store, so the timings only cover fetching. Run
+from the repository root:
+
+    python -m bench.fetch --games 6000 --latency 150 --jitter 100 --concurrency 1,4,8,16
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+import tracemalloc
+
+import aiohttp
+
+import src.api as api
+import src.config as config
+import src.pagesize as pagesize
+from bench import mock_server
+from bench.run import format_bytes
+
+
+async def fetch_once(concurrency: int, riot_id: str, page_size: int) -> float:
+    api._limiters.clear()  # every run starts with a full token bucket
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        history = await api.fetch_history(
+            session,
+            asyncio.Semaphore(concurrency),
+            riot_id,
+            "EUW",
+            sizer=pagesize.PageSize(page_size),
+        )
+    elapsed = time.perf_counter() - start
+    if history.newest is None:
+        raise Exception("No games fetched")
+    return elapsed
+
+
+async def run(args) -> None:
+    if args.replay:
+        source = mock_server.ReplaySource(args.replay)
+    else:
+        source = mock_server.SyntheticSource(args.games, args.seed)
+    app = mock_server.make_app(
+        source, args.latency / 1000, args.jitter / 1000, args.error_rate, args.seed
+    )
+    runner, config.MOBALYTICS_URL, config.DEEPLOL_URL = await mock_server.start(app)
+
+    try:
+        print(
+            f"{'concurrency':>12}{'best':>10}{'median':>10}{'requests':>10}"
+            f"{'peak mem':>12}"
+        )
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            times = []
+            app["attempts"].clear()
+            for _ in range(args.repeat):
+                times.append(
+                    await fetch_once(concurrency, args.riot_id, args.page_size)
+                )
+            requests = sum(app["attempts"].values()) // args.repeat
+
+            # One more run traced by tracemalloc, which also counts what the server
+            # allocates for each response
+            tracemalloc.start()
+            await fetch_once(concurrency, args.riot_id, args.page_size)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            times.sort()
+            print(
+                f"{concurrency:>12}{times[0]:>9.2f}s"
+                f"{times[len(times) // 2]:>9.2f}s{requests:>10}{format_bytes(peak):>12}"
+            )
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fetching LP histories")
+    parser.add_argument(
+        "--concurrency",
+        default="1,2,4,8,16",
+        help="Comma separated concurrency settings (default: 1,2,4,8,16)",
+    )
+    parser.add_argument(
+        "--games", type=int, default=6000, help="Games in the synthetic history"
+    )
+    parser.add_argument(
+        "--replay", metavar="DIR", help="Serve responses recorded in DIR instead"
+    )
+    parser.add_argument(
+        "--riot-id",
+        default="Bench#BENCH",
+        help="Riot ID to fetch, must be recorded when replaying (default: Bench#BENCH)",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=150,
+        help="Games per page (default: 150)",
+    )
+    parser.add_argument("--latency", type=float, default=100, help="Latency in ms")
+    parser.add_argument("--jitter", type=float, default=50, help="Jitter in ms")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=config.RATE_LIMIT,
+        help=f"Requests per second (default: config.RATE_LIMIT={config.RATE_LIMIT})",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    config.RATE_LIMIT = args.rate_limit
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Checks that every path of lol-lp.py imports within its time budget and does not load
+modules it has no use for, so that startup stays fast when lol-lp is launched from a
+hotkey. Exits with status 1 if any check fails. Run from the repository root:
+
+    python -m bench.import_budget
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# path: (modules it imports, budget in ms, modules it must not load)
+BUDGETS = {
+    "startup": (
+        ["argparse", "logging", "src.config", "src.profiling", "src.util"],
+        40,
+        ["pytz", "numpy", "aiohttp", "requests", "matplotlib"],
+    ),
+    "select": (
+        ["src.select_player"],
+        40,
+        ["pytz", "numpy", "aiohttp", "requests", "matplotlib"],
+    ),
+    "client": (  # asking a running daemon to plot
+        ["src.daemon"],
+        40,
+        ["pytz", "numpy", "aiohttp", "requests", "matplotlib"],
+    ),
+    "fetch": (
+        ["asyncio", "src.api", "src.data_processing"],
+        600,
+        ["pytz", "requests", "matplotlib", "PyQt5"],
+    ),
+    "bulk": (
+        ["src.bulk"],
+        600,
+        ["pytz", "requests", "matplotlib", "PyQt5"],
+    ),
+    "plot": (
+        ["src.plot"],
+        1500,
+        ["PyQt5"],  # Qt is only imported once a window is shown
+    ),
+}
+
+
+def run_import(modules: list[str], importtime=False) -> tuple[float, set, str]:
+    """
+    Imports the modules in a fresh interpreter. Returns the time the imports took in
+    seconds, the top level packages loaded afterwards and the -X importtime report.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(modules or ['sys'])}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "import json\n"
+        "print(json.dumps([elapsed, sorted({m.split('.')[0] for m in sys.modules})]))\n"
+    )
+    flags = ["-X", "importtime"] if importtime else []
+    result = subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=os.environ | {"MPLBACKEND": "Agg"},
+    )
+    elapsed, loaded = json.loads(result.stdout)
+    return elapsed, set(loaded), result.stderr
+
+
+def slowest_imports(report: str, count=5) -> list[tuple[str, int]]:
+    """
+    Returns the top level imports of an -X importtime report that took the longest, with
+    their cumulative time in microseconds. Imports done by the interpreter on startup
+    are left out.
+    """
+    _, _, startup = run_import([], importtime=True)
+    imports = []
+    for line in report.splitlines()[len(startup.splitlines()) :]:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue  # the header, or a nested import
+        imports.append((name.strip(), int(cumulative)))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of lol-lp")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Timed runs per path (default: 5)"
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiply every budget by this, for slower machines (default: 1)",
+    )
+    parser.add_argument("--only", help="Only check paths containing this string")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'path':<10}{'median':>10}{'budget':>10}  result")
+    for path, (modules, budget, forbidden) in BUDGETS.items():
+        if args.only and args.only not in path:
+            continue
+        run_import(modules)  # warm up, so that compiling bytecode is not measured
+        runs = [run_import(modules) for _ in range(args.repeat)]
+        median = statistics.median(elapsed for elapsed, _, _ in runs) * 1000
+        budget *= args.scale
+        unwanted = sorted(set(forbidden) & runs[0][1])
+
+        problems = []
+        if median > budget:
+            problems.append("over budget")
+        if unwanted:
+            problems.append(f"loads {', '.join(unwanted)}")
+        failed = failed or bool(problems)
+        print(
+            f"{path:<10}{median:>8.1f}ms{budget:>8.0f}ms  {'; '.join(problems) or 'ok'}"
+        )
+
+        if median > budget:
+            _, _, report = run_import(modules, importtime=True)
+            for name, cumulative in slowest_imports(report):
+                print(f"{'':<10}{cumulative / 1000:>8.1f}ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
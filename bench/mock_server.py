@@ -0,0 +1,264 @@
+"""
+A local stand-in for the Mobalytics GraphQL endpoint and the deeplol.gg tier boundaries,
+for benchmarking fetches offline. Pages are synthetic, replayed from disk or recorded
+from the real service, with injectable latency, jitter and errors. Run from the
+repository root:
+
+    python -m bench.mock_server --latency 200 --jitter 100 --error-rate 0.05
+
+and point lol-lp at it with LOL_LP_MOBALYTICS_URL and LOL_LP_DEEPLOL_URL.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import urllib.parse as urllib
+
+import aiohttp
+from aiohttp import web
+
+from bench.synthetic import (
+    APEX_CUTOFFS,
+    generate_items,
+    generate_thresholds,
+    paginate,
+)
+
+__all__ = ["SyntheticSource", "ReplaySource", "RecordSource", "make_app", "start"]
+
+logger = logging.getLogger(__name__)
+
+QUERY_PATH = "/api/lol/graphql/v1/query"
+TIER_BOUNDARY_PATH = "/common/tier-boundary"
+UPSTREAM_URL = "https://mobalytics.gg/api/lol/graphql/v1/query"
+REGION_CODES = ["NA1", "EUW1", "EUN1", "BR1", "JP1", "KR", "LA1", "LA2", "OC1", "TR1"]
+
+
+def response_body(lp_history: dict) -> dict:
+    return {"data": {"lol": {"player": {"lpHistory": lp_history}}}}
+
+
+def error_body(message: str) -> dict:
+    return {"errors": [{"message": message}]}
+
+
+class SyntheticSource:
+    """
+    Serves generated histories of `games` games. Every player gets their own history,
+    seeded by their riot ID so that it stays the same between runs. Pages of more than
+    max_page_size games are answered with an error, like an endpoint with a size cap.
+    """
+
+    def __init__(self, games: int, seed=0, max_page_size: int | None = None):
+        self.games = games
+        self.seed = seed
+        self.max_page_size = max_page_size
+        self._pages: dict[tuple[str, int], list[dict]] = {}
+
+    async def get(self, variables: dict, body: dict) -> dict:
+        riot_id = f"{variables['gameName']}#{variables['tagLine']}"
+        key = (riot_id, variables["cLpPerPage"])
+        if self.max_page_size is not None and key[1] > self.max_page_size:
+            return error_body(f"cLpPerPage must be at most {self.max_page_size}")
+        if key not in self._pages:
+            items = generate_items(self.games, seed=f"{self.seed}:{riot_id}")
+            self._pages[key] = paginate(items, key[1], generate_thresholds())
+
+        pages = self._pages[key]
+        page_index = variables["cLpPageIndex"]
+        if page_index > len(pages):
+            # Past the last page there are no items, like an empty history
+            return response_body(
+                {
+                    "items": [],
+                    "thresholds": [],
+                    "pageInfo": {"currentPage": page_index, "totalPages": len(pages)},
+                }
+            )
+        return response_body(pages[page_index - 1])
+
+
+def recording_path(directory: str, variables: dict) -> str:
+    riot_id = f"{variables['gameName']}#{variables['tagLine']}"
+    file_name = "{}_{}_{}_{}.json".format(
+        urllib.quote(riot_id, safe=""),
+        variables["region"],
+        variables["cLpPerPage"],
+        variables["cLpPageIndex"],
+    )
+    return os.path.join(directory, file_name)
+
+
+class ReplaySource:
+    """
+    Serves the responses recorded by RecordSource.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    async def get(self, variables: dict, body: dict) -> dict:
+        path = recording_path(self.directory, variables)
+        try:
+            with open(path, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return error_body(f"No recorded response at {path}")
+
+
+class RecordSource:
+    """
+    Forwards requests to the real service and saves every successful response to disk.
+    """
+
+    def __init__(self, directory: str, upstream=UPSTREAM_URL):
+        self.directory = directory
+        self.upstream = upstream
+        self._session: aiohttp.ClientSession | None = None
+
+    async def get(self, variables: dict, body: dict) -> dict:
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+
+        headers = {
+            "content-type": "application/json",
+            "x-moba-client": "mobalytics-web",
+            "x-moba-proxy-gql-ops-name": body.get("operationName", ""),
+        }
+        async with self._session.post(
+            self.upstream, headers=headers, json=body
+        ) as response:
+            response.raise_for_status()
+            res = await response.json()
+
+        if "errors" not in res:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(recording_path(self.directory, variables), "w") as file:
+                json.dump(res, file)
+        return res
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+def make_app(
+    source, latency=0.0, jitter=0.0, error_rate=0.0, seed=0
+) -> web.Application:
+    """
+    Returns the app serving pages from `source`. Every response is delayed by `latency`
+    plus up to `jitter` seconds, and fails with a 503 or a 429 with probability
+    `error_rate`. The random draws only depend on the seed, the request and how many
+    times it was made, so runs are reproducible regardless of the request order.
+    """
+    attempts: dict[str, int] = {}
+
+    async def query(request: web.Request) -> web.Response:
+        body = await request.json()
+        variables = body["variables"]
+        key = json.dumps(variables, sort_keys=True)
+        attempts[key] = attempts.get(key, 0) + 1
+        rng = random.Random(f"{seed}:{key}:{attempts[key]}")
+
+        await asyncio.sleep(latency + rng.uniform(0, jitter))
+        if rng.random() < error_rate:
+            if rng.random() < 0.5:
+                return web.Response(status=429, headers={"Retry-After": "1"})
+            return web.Response(status=503)
+
+        try:
+            return web.json_response(await source.get(variables, body))
+        except Exception as e:
+            logger.error(f"Error serving {variables}: {e}")
+            return web.Response(status=502, text=str(e))
+
+    async def tier_boundary(request: web.Request) -> web.Response:
+        return web.json_response(
+            {"tier_boundary_solo": {code: APEX_CUTOFFS for code in REGION_CODES}}
+        )
+
+    async def close_source(app: web.Application) -> None:
+        if hasattr(source, "close"):
+            await source.close()
+
+    app = web.Application()
+    app["attempts"] = attempts
+    app.on_cleanup.append(close_source)
+    app.router.add_post(QUERY_PATH, query)
+    app.router.add_get(TIER_BOUNDARY_PATH, tier_boundary)
+    return app
+
+
+async def start(app: web.Application, host="127.0.0.1", port=0) -> tuple:
+    """
+    Starts serving the app and returns its runner together with the URLs to use as
+    config.MOBALYTICS_URL and config.DEEPLOL_URL. Port 0 picks a free port.
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    base = f"http://{host}:{port}"
+    return runner, base + QUERY_PATH, base + TIER_BOUNDARY_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for Mobalytics")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--replay", metavar="DIR", help="Serve responses from DIR")
+    source.add_argument(
+        "--record",
+        metavar="DIR",
+        help="Forward requests to Mobalytics and save the responses to DIR",
+    )
+    parser.add_argument(
+        "--games",
+        type=int,
+        default=3000,
+        help="Games per synthetic history (default: 3000)",
+    )
+    parser.add_argument(
+        "--max-page-size",
+        type=int,
+        metavar="N",
+        help="Fail synthetic pages of more than N games",
+    )
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="Latency in ms (default: 0)"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0, help="Maximum extra latency in ms"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests answered with a 429 or 503 (default: 0)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s]: %(message)s")
+
+    if args.replay:
+        source = ReplaySource(args.replay)
+    elif args.record:
+        source = RecordSource(args.record)
+    else:
+        source = SyntheticSource(args.games, args.seed, args.max_page_size)
+
+    app = make_app(
+        source, args.latency / 1000, args.jitter / 1000, args.error_rate, args.seed
+    )
+    print(f"LOL_LP_MOBALYTICS_URL=http://127.0.0.1:{args.port}{QUERY_PATH}")
+    print(f"LOL_LP_DEEPLOL_URL=http://127.0.0.1:{args.port}{TIER_BOUNDARY_PATH}")
+    web.run_app(app, host="127.0.0.1", port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
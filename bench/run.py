@@ -0,0 +1,120 @@
+"""
+Benchmarks the hot paths of the plotting pipeline on synthetic histories, reporting
+the time and peak memory of each. Run from the repository root:
+
+    python -m bench.run --games 1000,10000,50000
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import src.data_processing as data
+import src.plot as plot
+from bench.synthetic import APEX_CUTOFFS, generate_pages
+
+
+def measure(func, repeat: int) -> dict:
+    """
+    Returns the best and median wall time of `repeat` calls, and the peak memory
+    allocated by one more call traced with tracemalloc.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"best": min(times), "median": statistics.median(times), "peak": peak}
+
+
+def benchmarks(games: int) -> dict:
+    """
+    Returns the benchmarks for a history of the given number of games, each as a
+    function that runs the benchmarked code once.
+    """
+    pages = generate_pages(games)
+    all_thresholds = [page["thresholds"] for page in pages]
+    thresholds = data.merge_thresholds(all_thresholds, "EUW", cutoffs=APEX_CUTOFFS)
+    points = data.extract_points(pages)
+    values = [float(y) for y in points.y]
+    output = os.path.join(tempfile.mkdtemp(), "plot.png")
+
+    def rank_labels():
+        rank_scale = data.RankScale(thresholds)  # new per run, so the cache is cold
+        for y in values:
+            rank_scale.label(y, short=True, show_lp=True)
+
+    return {
+        "merge_thresholds": lambda: data.merge_thresholds(
+            all_thresholds, "EUW", cutoffs=APEX_CUTOFFS
+        ),
+        "extract_points": lambda: data.extract_points(pages),
+        "insert_roll_avg_lpdiff": lambda: data.insert_roll_avg_lpdiff(points),
+        "insert_roll_avg_wr": lambda: data.insert_roll_avg_wr(points),
+        "rank_labels": rank_labels,
+        "render_agg": lambda: plot.plot(
+            "Bench#BENCH", "EUW", points, thresholds, output
+        ),
+    }
+
+
+def format_bytes(size: int) -> str:
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lol-lp hot paths")
+    parser.add_argument(
+        "--games",
+        default="1000,10000",
+        help="Comma separated history sizes in games (default: 1000,10000)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Timed runs per benchmark (default: 5)"
+    )
+    parser.add_argument("--only", help="Only run benchmarks containing this string")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to PATH")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = []
+    print(f"{'benchmark':<24}{'games':>8}{'best':>12}{'median':>12}{'peak mem':>12}")
+    for games in [int(size) for size in args.games.split(",")]:
+        for name, func in benchmarks(games).items():
+            if args.only and args.only not in name:
+                continue
+            result = {"benchmark": name, "games": games} | measure(func, args.repeat)
+            results.append(result)
+            print(
+                f"{name:<24}{games:>8}"
+                f"{result['best'] * 1000:>10.2f}ms{result['median'] * 1000:>10.2f}ms"
+                f"{format_bytes(result['peak']):>12}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Generates synthetic Mobalytics lpHistory pages, shaped like the responses that
+src.api.async_get_page returns.
+"""
+
+import random
+
+import src.config as config
+
+__all__ = ["generate_thresholds", "generate_items", "paginate", "generate_pages"]
+
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND"]
+DIVISIONS = ["IV", "III", "II", "I"]
+APEX_TIERS = ["MASTER", "GRANDMASTER", "CHALLENGER"]
+PATCHES_PER_SEASON = 24
+PLACEMENT_GAMES = 5  # games without LP at the start of every season
+APEX_CUTOFFS = {"grandmaster": 200, "challenger": 500}  # to pass to merge_thresholds
+
+
+def generate_thresholds(apex=True) -> list[dict]:
+    """
+    Returns the thresholds of every tier and division, with 100 values per division below
+    master. Apex tiers get placeholder values, as their real boundaries come from the
+    apex cutoffs.
+    """
+    thresholds = []
+    value = 0
+    for tier in TIERS:
+        for division in DIVISIONS:
+            thresholds.append(
+                {
+                    "tier": tier,
+                    "division": division,
+                    "minValue": value,
+                    "maxValue": value + 100,
+                }
+            )
+            value += 100
+
+    if apex:
+        for tier in APEX_TIERS:
+            thresholds.append(
+                {
+                    "tier": tier,
+                    "division": "I",
+                    "minValue": config.MASTER_VALUE,
+                    "maxValue": config.MASTER_VALUE + 100,
+                }
+            )
+
+    return thresholds
+
+
+def _lp(value: int) -> dict:
+    if value >= config.MASTER_VALUE:
+        tier, division, lp = "MASTER", "I", value - config.MASTER_VALUE
+    else:
+        tier = TIERS[value // 400]
+        division = DIVISIONS[value % 400 // 100]
+        lp = value % 100
+    return {"value": value, "lp": lp, "tier": tier, "division": division}
+
+
+def generate_items(
+    games: int,
+    seed=0,
+    start_value=1200,
+    apex=True,
+    games_per_patch=150,
+    end_time=1_700_000_000,
+) -> list[dict]:
+    """
+    Returns `games` lpHistory items, newest first, from a random walk of the rank value.
+    Every season starts with placement games without LP, some games are remakes and the
+    value goes into the apex tiers unless apex=False.
+    """
+    rng = random.Random(seed)
+    max_value = config.MASTER_VALUE + 1500 if apex else config.MASTER_VALUE - 1
+
+    items = []
+    value = start_value
+    timestamp = end_time - games * 3 * 3600
+    for i in range(games):
+        patch_number = i // games_per_patch
+        season, patch = divmod(patch_number, PATCHES_PER_SEASON)
+        timestamp += rng.randint(1800, 2 * 24 * 3600) // 8
+
+        if patch == 0 and i % games_per_patch < PLACEMENT_GAMES:
+            lp = {"before": None, "after": None, "lpDiff": None}
+            result = rng.choice(["WON", "LOST"])
+        elif rng.random() < 0.02:
+            lp = {"before": _lp(value), "after": _lp(value), "lpDiff": 0}
+            result = "REMAKE"
+        else:
+            won = rng.random() < 0.51
+            lp_diff = rng.randint(15, 25) * (1 if won else -1)
+            before = value
+            value = min(max(value + lp_diff, 0), max_value)
+            lp = {"before": _lp(before), "after": _lp(value), "lpDiff": lp_diff}
+            result = "WON" if won else "LOST"
+
+        items.append(
+            {
+                "lp": lp,
+                "patch": f"{14 + season}.{patch + 1}",
+                "result": result,
+                "startedAt": timestamp,
+            }
+        )
+
+    items.reverse()
+    return items
+
+
+def paginate(
+    items: list[dict], page_size=150, thresholds: list[dict] | None = None
+) -> list[dict]:
+    """
+    Splits items (newest first) into pages, the first page holding the newest items.
+    """
+    if thresholds is None:
+        thresholds = generate_thresholds()
+
+    chunks = [items[i : i + page_size] for i in range(0, len(items), page_size)]
+    return [
+        {
+            "items": chunk,
+            "thresholds": [dict(threshold) for threshold in thresholds],
+            "pageInfo": {"currentPage": i + 1, "totalPages": len(chunks)},
+        }
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def generate_pages(games: int, page_size=150, seed=0, apex=True) -> list[dict]:
+    return paginate(
+        generate_items(games, seed=seed, apex=apex),
+        page_size,
+        generate_thresholds(apex),
+    )
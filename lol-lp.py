@@ -1,8 +1,9 @@
 #!/usr/bin/env python
 import argparse
 import logging
-from time import sleep
 
+import src.config as config
+import src.profiling as profiling
 import src.util as util
 
 logging.basicConfig(level=logging.INFO, format="[%(levelname)s]: %(message)s")
@@ -12,14 +13,253 @@ parser = argparse.ArgumentParser(description="League of Legends LP history")
 parser.add_argument(
     "-s", "--select", action="store_true", help="Select a player interactively"
 )
+parser.add_argument(
+    "-b",
+    "--bulk",
+    metavar="FILE",
+    help="Print a summary of every player in FILE, one '<riot ID> <region>' per line",
+)
+parser.add_argument(
+    "--bulk-bookmarks",
+    action="store_true",
+    help="Print a summary of every bookmarked player",
+)
+parser.add_argument(
+    "--bookmarks-folder",
+    default=config.BOOKMARKS_FOLDER,
+    metavar="NAME",
+    help="Bookmark folder holding the players for -s/--select and --bulk-bookmarks, "
+    f"subfolders included (default: {config.BOOKMARKS_FOLDER})",
+)
 parser.add_argument("-i", "--riot-id", help="Riot ID of the player")
 parser.add_argument("-r", "--region", help="Region of the player")
 parser.add_argument("-n", "--notify", action="store_true", help="Enable notifications")
+parser.add_argument(
+    "-c",
+    "--concurrency",
+    type=int,
+    default=config.FETCH_CONCURRENCY,
+    help=f"Maximum number of pages fetched at once (default: {config.FETCH_CONCURRENCY})",
+)
+parser.add_argument(
+    "--page-size",
+    default=config.PAGE_SIZE,
+    metavar="N|auto",
+    help="Games fetched per page. 'auto' probes larger pages and backs off when they "
+    "fail or are slow, remembering the best size per region "
+    f"(default: {config.PAGE_SIZE})",
+)
+parser.add_argument(
+    "-o",
+    "--output",
+    metavar="PATH",
+    help="Save the plot to PATH (.png or .svg) instead of showing it. "
+    "In bulk mode PATH is a directory that gets one image per player",
+)
+parser.add_argument(
+    "-e",
+    "--export",
+    metavar="PATH",
+    help="Export the games and thresholds to PATH for analysis, as Parquet (.parquet) "
+    "or Arrow IPC (.arrow, .feather), with the thresholds in a .thresholds file next "
+    "to it. Needs pyarrow. The plot is then only shown with --watch, or saved with -o",
+)
+parser.add_argument(
+    "--format",
+    choices=["png", "svg"],
+    default="png",
+    help="Image format of the plots saved in bulk mode (default: png)",
+)
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    help="Number of processes rendering plots in bulk mode (default: all cores)",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="Refetch the whole history instead of only the games missing from the cache",
+)
+parser.add_argument(
+    "--refresh-cutoffs",
+    action="store_true",
+    help="Fetch the apex tier cutoffs even if they are cached",
+)
+parser.add_argument(
+    "--offline",
+    action="store_true",
+    help="Plot the games stored by earlier runs without fetching anything",
+)
+parser.add_argument(
+    "--last-games",
+    type=int,
+    metavar="N",
+    help="Only plot the last N games. Players that are not stored yet only have the "
+    "pages holding them fetched",
+)
+parser.add_argument(
+    "--since",
+    metavar="YYYY-MM-DD",
+    help="Only plot the games played since this date. Players that are not stored "
+    "yet only have the pages holding them fetched",
+)
+parser.add_argument(
+    "--patches",
+    metavar="FROM:TO",
+    help="Only plot the games of these patches, e.g. 14.1:14.10, 14.5: or 14.3 "
+    "(needs --offline)",
+)
+parser.add_argument(
+    "--watch",
+    nargs="?",
+    type=float,
+    const=config.WATCH_INTERVAL,
+    metavar="SECONDS",
+    help="Keep adding new games to the plot, checking for them every SECONDS "
+    f"(default: {config.WATCH_INTERVAL})",
+)
+parser.add_argument(
+    "--daemon",
+    action="store_true",
+    help="Run in the background and open plots requested by other invocations",
+)
+parser.add_argument(
+    "--no-daemon",
+    action="store_true",
+    help="Plot in this process even if a daemon is running",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="Print the wall and CPU time of each stage of the run",
+)
+parser.add_argument(
+    "--profile-json",
+    metavar="PATH",
+    help="Write the time of each stage to PATH as JSON (implies --profile)",
+)
+parser.add_argument(
+    "--profile-dump",
+    metavar="PATH",
+    help="Profile the whole run with cProfile and dump the stats to PATH "
+    "(implies --profile)",
+)
 
 args = parser.parse_args()
 
 notify = args.notify or args.select
 
+profile = args.profile or args.profile_json or args.profile_dump
+if profile:
+    profiling.start(json_path=args.profile_json, dump_path=args.profile_dump)
+
+if args.concurrency < 1:
+    parser.error("-c/--concurrency must be at least 1")
+if args.jobs is not None and args.jobs < 1:
+    parser.error("-j/--jobs must be at least 1")
+if args.page_size != "auto":
+    try:
+        args.page_size = int(args.page_size)
+    except ValueError:
+        parser.error("--page-size must be a number of games or auto")
+    if args.page_size < 1:
+        parser.error("--page-size must be at least 1")
+if args.watch is not None:
+    if args.watch <= 0:
+        parser.error("--watch must be a positive number of seconds")
+    if args.output or args.bulk or args.bulk_bookmarks:
+        parser.error("--watch needs a window, it cannot be used with -o or bulk mode")
+
+since, patches = None, (None, None)
+if args.last_games is not None and args.last_games < 1:
+    parser.error("--last-games must be at least 1")
+if args.since:
+    import datetime
+
+    try:
+        since = datetime.datetime.strptime(args.since, "%Y-%m-%d")
+    except ValueError:
+        parser.error("--since must be a date like 2024-01-31")
+    since = config.LOCAL_TIMEZONE.localize(since)  # from local midnight
+if args.patches:
+    if not args.offline:
+        parser.error("--patches needs --offline")
+    first, _, last = args.patches.partition(":")
+    patches = (first or None, (last if ":" in args.patches else first) or None)
+    if not all(part.replace(".", "").isdigit() for part in patches if part is not None):
+        parser.error("--patches must be patches like 14.1:14.10")
+if args.offline:
+    if args.no_cache or args.refresh_cutoffs or args.watch is not None:
+        parser.error(
+            "--offline cannot be used with --no-cache, --refresh-cutoffs or --watch"
+        )
+    if args.bulk or args.bulk_bookmarks:
+        parser.error("--offline cannot be used in bulk mode")
+
+if args.daemon:
+    import src.daemon as daemon
+
+    if args.select or args.riot_id or args.region or args.bulk or args.bulk_bookmarks:
+        parser.error("--daemon takes no player, it plots the players requested to it")
+    if (
+        args.output
+        or args.export
+        or args.watch is not None
+        or args.offline
+        or args.last_games is not None
+        or args.since
+    ):
+        parser.error(
+            "--daemon cannot be used with -o, -e/--export, --watch, --offline, "
+            "--last-games or --since"
+        )
+    try:
+        daemon.serve()
+    except daemon.DaemonError as e:
+        print(f"Could not start the daemon: {e}")
+        exit(1)
+    exit(0)
+
+if args.bulk or args.bulk_bookmarks:
+    import src.bulk as bulk
+
+    if args.select or args.riot_id or args.region:
+        parser.error(
+            "Do not provide -s/--select, -i/--riot-id or -r/--region in bulk mode"
+        )
+    if args.bulk and args.bulk_bookmarks:
+        parser.error("Provide only one of -b/--bulk and --bulk-bookmarks")
+
+    try:
+        players = (
+            bulk.read_players(args.bulk)
+            if args.bulk
+            else bulk.bookmarked_players(args.bookmarks_folder)
+        )
+    except (OSError, ValueError) as e:
+        parser.error(f"Could not read players: {e}")
+
+    try:
+        summary = bulk.run(
+            players,
+            args.concurrency,
+            use_cache=not args.no_cache,
+            output_dir=args.output,
+            image_format=args.format,
+            workers=args.jobs,
+            export_path=args.export,
+            last_games=args.last_games,
+            since=since,
+            page_size=args.page_size,
+            refresh_cutoffs=args.refresh_cutoffs,
+        )
+    except (OSError, bulk.ExportError) as e:
+        print(f"Error exporting data: {e}")
+        exit(1)
+    print(summary)
+    exit(0)
+
 if args.select:
     import src.select_player as select_player
 
@@ -27,35 +267,110 @@ if args.select:
         parser.error(
             "Do not provide -i/--riot-id or -r/--region when using -s/--select"
         )
-    args.riot_id, args.region = select_player.select_player()
+    try:
+        args.riot_id, args.region = select_player.select_player(args.bookmarks_folder)
+    except (OSError, ValueError) as e:
+        parser.error(f"Could not read players: {e}")
 elif not args.riot_id or not args.region:
     parser.error(
         "Both -i/--riot-id and -r/--region are required when not using -s/--select"
     )
 
+if not args.select:
+    args.riot_id = util.transform_riot_id(args.riot_id, args.region)
+
+# Let a running daemon plot the player, which skips loading everything in this process
+if not (
+    args.no_daemon
+    or args.output
+    or args.export
+    or args.watch
+    or args.offline
+    or profile
+):
+    import src.daemon as daemon
+
+    try:
+        if notify:
+            util.notif(f"Fetching pages for {args.riot_id}...")
+        str = daemon.request(
+            args.riot_id,
+            args.region.upper(),
+            concurrency=args.concurrency,
+            use_cache=not args.no_cache,
+            refresh_cutoffs=args.refresh_cutoffs,
+            last_games=args.last_games,
+            since=since and since.timestamp(),
+            page_size=args.page_size,
+        )
+    except daemon.DaemonError as e:
+        error_msg = "Error getting data"
+        print(f"{error_msg}: {e}")
+        if notify:
+            util.notif(f"❌ {error_msg}", 5000)
+        exit(1)
+    except OSError:
+        pass  # no daemon running, or its socket cannot be used
+    else:
+        if notify:
+            util.notif(str or "Done", 5000 if str else 1)
+        exit(0)
+
 try:
     import asyncio
 
     import src.api as api
     import src.data_processing as data_processing
 
-    if not args.select:
-        args.riot_id = util.transform_riot_id(args.riot_id, args.region)
+    if args.offline:
+        import src.store as store
 
-    if notify:
-        util.notif(f"Fetching pages for {args.riot_id}...")
-    pages = asyncio.run(api.get_lphistory(args.riot_id, args.region.upper()))
+        with profiling.stage("load"):
+            history = store.load_history(
+                args.riot_id,
+                args.region.upper(),
+                last_games=args.last_games,
+                since=since,
+                patches=patches,
+            )
+        if history is None:
+            raise Exception(f"No stored games of {args.riot_id}, run without --offline")
+    else:
+        progress = None
+        if notify:
+            util.notif(f"Fetching pages for {args.riot_id}...")
+
+            def progress(done, total):
+                util.notif(f"Fetching pages for {args.riot_id}... {done}/{total}")
+
+        with profiling.stage("fetch"):
+            history = asyncio.run(
+                api.get_lphistory(
+                    args.riot_id,
+                    args.region.upper(),
+                    concurrency=args.concurrency,
+                    use_cache=not args.no_cache,
+                    last_games=args.last_games,
+                    since=since,
+                    progress=progress,
+                    page_size=args.page_size,
+                )
+            )
 
-    if len(pages) == 0:
+    if history.newest is None:
         if notify:
             util.notif(f"No data found.", 5000)
         exit(0)
 
     if notify:
         util.notif(f"Merging thresholds...")
-    thresholds = data_processing.merge_thresholds(
-        [page["thresholds"] for page in pages], args.region.upper()
-    )
+    with profiling.stage("merge_thresholds"):
+        thresholds = data_processing.merge_thresholds(
+            [history.thresholds],
+            args.region.upper(),
+            refresh_cutoffs=args.refresh_cutoffs,
+            offline=args.offline,
+        )
 
 except Exception as e:
     error_msg = "Error getting data"
@@ -64,13 +379,53 @@ except Exception as e:
         util.notif(f"❌ {error_msg}", 5000)
     exit(1)
 
+if args.export:
+    import src.export as export
+
+    try:
+        with profiling.stage("export"), export.Exporter(args.export) as exporter:
+            exporter.add(args.riot_id, args.region.upper(), history.points, thresholds)
+    except Exception as e:
+        error_msg = "Error exporting data"
+        print(f"{error_msg}: {e}")
+        if notify:
+            util.notif(f"❌ {error_msg}", 5000)
+        exit(1)
+    if not args.output and args.watch is None:
+        if notify:
+            util.notif(f"Exported to {args.export}", 5000)
+        exit(0)
+
 if notify:
-    sleep(0.01)  # without this the notif sometimes gets stuck
     util.notif("Done", 1)
 
-import src.plot as plot
+if args.output:
+    import matplotlib
 
-str = plot.plot(args.riot_id, args.region.upper(), pages, thresholds)
+    matplotlib.use("Agg")  # render without a window, and without importing Qt
+
+with profiling.stage("import_plot"):
+    import src.plot as plot
+
+if args.watch is not None:
+    import src.watch as watch
+
+    str = watch.watch(
+        args.riot_id,
+        args.region.upper(),
+        history,
+        thresholds,
+        interval=args.watch,
+        page_size=args.page_size,
+    )
+else:
+    str = plot.plot(
+        args.riot_id,
+        args.region.upper(),
+        history.points,
+        thresholds,
+        output=args.output,
+    )
 if str != "":
     if notify:
         util.notif(str, 5000)
@@ -1,13 +1,28 @@
 import asyncio
+import contextlib
+import datetime
+import email.utils
 import logging
+import random
+import threading
+import time
+import urllib.parse as urllib
 
 import aiohttp
-import requests
 
-__all__ = ["get_lphistory", "get_apex_cutoffs"]
+import src.cache as cache
+import src.config as config
+import src.data_processing as data
+import src.pagesize as pagesize
+import src.store as store
+from src.ratelimit import TokenBucket
+
+__all__ = ["get_lphistory", "get_apex_cutoffs", "fetch_apex_cutoffs"]
 
 logger = logging.getLogger(__name__)
 
+_limiters: dict[str, TokenBucket] = {}
+
 
 class APIError(Exception):
     """Custom exception for API-related errors."""
@@ -15,11 +30,58 @@ class APIError(Exception):
     pass
 
 
+def get_limiter(url: str) -> TokenBucket:
+    """
+    Returns the rate limiter shared by all requests to the host of the url.
+    """
+    host = urllib.urlparse(url).netloc
+    if host not in _limiters:
+        _limiters[host] = TokenBucket(config.RATE_LIMIT, config.RATE_LIMIT_BURST)
+    return _limiters[host]
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Returns a random delay before retry number `attempt` (starting at 0), using
+    exponential backoff with full jitter.
+    """
+    return random.uniform(
+        0, min(config.RETRY_BACKOFF_MAX, config.RETRY_BACKOFF_BASE * 2**attempt)
+    )
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parses a Retry-After header, which is either a number of seconds or an HTTP date.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
 async def async_get_page(
-    session, summoner_name: str, region, page_index
+    session,
+    summoner_name: str,
+    region,
+    page_index,
+    page_size: int = 150,
+    sizer: pagesize.PageSize | None = None,
+    probe=False,
 ) -> dict | None:
     """
-    Asynchronously fetches a page of a player's League Points (LP) history from Mobalytics.
+    Asynchronously fetches a page of a player's League Points (LP) history from Mobalytics,
+    with page_size games per page. If set, sizer is told how long the page took. A probe
+    of a larger page size is tried only once, timing out after
+    config.PAGE_SIZE_PROBE_TIMEOUT seconds, so that a size the endpoint cannot handle
+    fails fast.
     """
     headers = {
         "authority": "mobalytics.gg",
@@ -43,7 +105,7 @@ async def async_get_page(
     json_data = {
         "operationName": "LolProfilePageLpGainsQuery",
         "variables": {
-            "cLpPerPage": 150,
+            "cLpPerPage": page_size,
             "cLpPageIndex": page_index,
             "gameName": game_name,
             "tagLine": tag_line,
@@ -52,95 +114,402 @@ async def async_get_page(
         "extensions": {
             "persistedQuery": {
                 "version": 1,
-                "sha256Hash": "bade8e2e917de67ec76c0e30e82d2bc38c40fa0af1ed61a7dbe0a795cd49857f",
+                "sha256Hash": config.LP_HISTORY_QUERY_HASH,
             },
         },
     }
 
-    try:
-        logger.info(f"Fetching page {page_index} for {summoner_name}...")
-        async with session.post(
-            "https://mobalytics.gg/api/lol/graphql/v1/query",
-            headers=headers,
-            json=json_data,
-        ) as response:
-            if response.status != 200:
-                content = await response.text()
-                logger.error(f"Non-200 HTTP status code: {response.status}")
-                logger.error(f"Response content: {content}")
-                response.raise_for_status()
-
-            res = await response.json()
-            if "errors" in res:
-                raise APIError(f"{res['errors']}")
-            return res["data"]["lol"]["player"]["lpHistory"]
-
-    except aiohttp.ClientError as e:
-        logger.error(f"Client error fetching page {page_index}: {e}")
-    except asyncio.TimeoutError as e:
-        logger.error(f"Timeout error fetching page {page_index}: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error fetching page {page_index}: {e}")
+    url = config.MOBALYTICS_URL
+    limiter = get_limiter(url)
+    attempts = 1 if probe else config.FETCH_RETRIES + 1
+    timeout = session.timeout
+    if probe:
+        timeout = aiohttp.ClientTimeout(total=config.PAGE_SIZE_PROBE_TIMEOUT)
+
+    for attempt in range(attempts):
+        retry_after = None
+        try:
+            await limiter.acquire()
+            logger.info(f"Fetching page {page_index} for {summoner_name}...")
+            start = time.monotonic()
+            async with session.post(
+                url, headers=headers, json=json_data, timeout=timeout
+            ) as response:
+                if response.status != 200:
+                    content = await response.text()
+                    logger.error(f"Non-200 HTTP status code: {response.status}")
+                    logger.error(f"Response content: {content}")
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if response.status == 429:
+                        limiter.pause(retry_after or backoff_delay(attempt))
+                    response.raise_for_status()
+
+                res = await response.json()
+                if "errors" in res:
+                    raise APIError(f"{res['errors']}")
+                if sizer is not None:
+                    sizer.record(page_size, time.monotonic() - start, attempt)
+                return res["data"]["lol"]["player"]["lpHistory"]
+
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"HTTP error fetching page {page_index}: {e}")
+            if e.status != 429 and e.status < 500:
+                return None  # the request itself is bad, retrying won't help
+        except aiohttp.ClientError as e:
+            logger.error(f"Client error fetching page {page_index}: {e}")
+        except asyncio.TimeoutError as e:
+            logger.error(f"Timeout error fetching page {page_index}: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error fetching page {page_index}: {e}")
+            return None
+
+        if attempt < attempts - 1:
+            delay = retry_after if retry_after is not None else backoff_delay(attempt)
+            logger.info(f"Retrying page {page_index} in {delay:.1f}s...")
+            await asyncio.sleep(delay)
 
+    logger.error(f"Giving up on page {page_index}")
     return None
 
 
-async def get_lphistory(
-    summoner_name, region, page_limit=None, batch_size=4
-) -> list[dict]:
+async def get_page(
+    session,
+    semaphore,
+    summoner_name,
+    region,
+    page_index,
+    page_size=150,
+    sizer=None,
+    probe=False,
+) -> dict:
+    """
+    Fetches a page once the semaphore allows another request in flight. Throws an
+    exception if the page fails to fetch.
     """
-    Asynchronously fetches a player's League of Legends LP history from the Mobalytics API,
-    using batched requests to manage load. Throws an exception if any page fails to fetch. If
-    the first page has no data (e.g no games played), an empty list is returned.
+    async with semaphore:
+        page = await async_get_page(
+            session, summoner_name, region, page_index, page_size, sizer, probe
+        )
+    if page is None:
+        raise Exception(f"Failed to fetch page {page_index}.")
+    return page
+
+
+async def stream_pages(
+    session,
+    semaphore,
+    summoner_name,
+    region,
+    page_limit=None,
+    progress=None,
+    sizer: pagesize.PageSize | None = None,
+    last_games: int | None = None,
+):
+    """
+    Fetches every page of a player's LP history, yielding (page index, page) as soon as
+    each page arrives, so not necessarily in order. As many requests are kept in flight
+    as the semaphore allows. Throws an exception as soon as any page fails to fetch.
+    If set, progress(pages done, total pages) is called as each page arrives. Set
+    last_games to only fetch the pages holding that many of the newest games.
+
+    Pages have the size of sizer, config.PAGE_SIZE by default. An adaptive sizer may
+    have the first page probe a larger size, which is then used for every page. If the
+    probe fails or comes back short, the first page is refetched at the sizer's size.
     """
-    async with aiohttp.ClientSession() as session:
+    sizer = sizer or pagesize.get(config.PAGE_SIZE, region)
+    first_page = None
+    page_size = sizer.probe()
+    if page_size is not None:
         try:
-            first_page = await async_get_page(
-                session, summoner_name, region, page_index=1
+            first_page = await get_page(
+                session, semaphore, summoner_name, region, 1, page_size, sizer, True
             )
-            if first_page is None:
-                raise Exception("Failed to fetch the first page.")
-
+        except Exception as e:
+            logger.info(f"Pages of {page_size} games failed: {e}")
+            sizer.rejected(page_size)
+        else:
             total_pages = first_page.get("pageInfo", {}).get("totalPages", 0)
-            logger.info(f"Total pages: {total_pages}")
-            if total_pages == 0:
-                logger.warning(f"First page has no data.")
-                return []
-
-            if page_limit is not None:
-                total_pages = min(total_pages, page_limit)
-
-            all_pages = [first_page]
-            for i in range(2, total_pages + 1, batch_size):
-                end = min(i + batch_size, total_pages + 1)
-                tasks = [
-                    async_get_page(session, summoner_name, region, j)
-                    for j in range(i, end)
-                ]
-
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                for result in results:
-                    if isinstance(result, dict):
-                        all_pages.append(result)
-                    else:
-                        raise Exception(
-                            f"Error fetching a page in batch starting at {i}: {result}"
-                        )
-
-            return all_pages
+            if total_pages > 1 and len(first_page["items"]) < page_size:
+                # The endpoint caps the page, so the offsets of the next pages may not
+                # line up with the games sent
+                sizer.rejected(page_size, accepted=len(first_page["items"]))
+                first_page = None
+    if first_page is None:
+        page_size = sizer.size
+        first_page = await get_page(
+            session, semaphore, summoner_name, region, 1, page_size, sizer
+        )
 
-        except Exception as e:
-            logger.error(f"Error when fetching pages for: {summoner_name}: {e}")
-            raise
+    total_pages = first_page.get("pageInfo", {}).get("totalPages", 0)
+    logger.info(f"Total pages: {total_pages}")
+    if total_pages == 0:
+        logger.warning(f"First page has no data.")
+        return
 
+    if page_limit is not None:
+        total_pages = min(total_pages, page_limit)
+    if last_games is not None:
+        total_pages = min(total_pages, -(-last_games // page_size))
+    if progress is not None:
+        progress(1, total_pages)
 
-def get_apex_cutoffs(
-    region: str,
-) -> dict[str, int]:  # TODO: handle the case where no cutoffs exist
-    # TODO: only fetch cutoffs once per day
+    async def get_indexed_page(page_index):
+        page = await get_page(
+            session, semaphore, summoner_name, region, page_index, page_size, sizer
+        )
+        return page_index, page
+
+    pending = {
+        asyncio.ensure_future(get_indexed_page(page_index))
+        for page_index in range(2, total_pages + 1)
+    }
+    fetched = 1
+    try:
+        yield 1, first_page
+        del first_page
+        while pending:
+            # Finished tasks are dropped right away, since they hold on to their page
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                fetched += 1
+                if progress is not None:
+                    progress(fetched, total_pages)
+                yield task.result()
+    finally:
+        for task in pending:  # stop the remaining requests if a page failed
+            task.cancel()
+
+
+async def fetch_history(
+    session,
+    semaphore,
+    summoner_name,
+    region,
+    page_limit=None,
+    progress=None,
+    sizer: pagesize.PageSize | None = None,
+) -> data.History:
+    """
+    Fetches the whole LP history of a player, extracting the points of each page as it
+    arrives, while the next ones are still being fetched, and dropping the page.
+    Throws an exception if any page fails to fetch. See stream_pages for progress and
+    sizer.
+    """
+    builder = data.HistoryBuilder()
+    async with contextlib.aclosing(
+        stream_pages(
+            session, semaphore, summoner_name, region, page_limit, progress, sizer
+        )
+    ) as pages:
+        async for page_index, page in pages:
+            builder.add_page(page_index, page)
+    return builder.build()
+
+
+async def fetch_new_games(
+    session,
+    semaphore,
+    summoner_name,
+    region,
+    newest: int | None,
+    last_games: int | None = None,
+    since: datetime.datetime | None = None,
+    progress=None,
+    sizer: pagesize.PageSize | None = None,
+) -> data.History:
+    """
+    Fetches pages starting from the first one, which holds the newest games, and returns
+    the games that started after `newest`. Stops at the first game that started at or
+    before `newest` or before `since`, or once `last_games` ranked games were found, and
+    drops the rest of that page. Usually only the first page or two have to be fetched.
+    If set, progress(pages done, total pages) is called after each page, where the total
+    is the number of pages of the whole history. Pages have the size of sizer,
+    config.PAGE_SIZE by default.
+
+    Without `newest`, the pages that should hold the last games are fetched at once
+    with stream_pages and added as they arrive, and the next ones one at a time if
+    placement games left them short. Walking the pages for `since` alone stays
+    sequential, since where it stops is only known from the games.
+    """
+    sizer = sizer or pagesize.get(config.PAGE_SIZE, region)
+    page_size = sizer.size
+    oldest = since.timestamp() if since is not None else None
+    builder = data.HistoryBuilder()
+    new_games, ranked_games = 0, 0
+
+    def add(page_index: int, page: dict, wanted: int | None) -> bool:
+        """
+        Adds the new games of a page, stopping after `wanted` ranked games, and returns
+        whether the walk stops at this page.
+        """
+        nonlocal new_games, ranked_games
+        new_items, done = [], False
+        for item in page["items"]:
+            if (newest is not None and item["startedAt"] <= newest) or (
+                oldest is not None and item["startedAt"] < oldest
+            ):
+                done = True  # the rest of the history is known or not wanted
+                break
+            new_items.append(item)
+            ranked_games += builder.is_ranked(item)
+            if wanted is not None and ranked_games >= wanted:
+                done = True
+                break
+        builder.add_page(
+            page_index, {"items": new_items, "thresholds": page["thresholds"]}
+        )
+        new_games += len(new_items)
+        return done
+
+    page_index, total_pages, done = 0, 1, False
+    if newest is None and last_games is not None:
+        last_page, held = 0, None
+        async with contextlib.aclosing(
+            stream_pages(
+                session,
+                semaphore,
+                summoner_name,
+                region,
+                progress=progress,
+                sizer=sizer,
+                last_games=last_games,
+            )
+        ) as pages:
+            async for index, page in pages:
+                if index == 1:  # always the first page yielded
+                    total_pages = page["pageInfo"]["totalPages"]
+                    if total_pages > 1:
+                        page_size = len(page["items"])  # what stream_pages settled on
+                    last_page = min(total_pages, -(-last_games // page_size))
+                if index < last_page:
+                    # The pages before the last hold fewer than last_games games, so
+                    # all of them are kept
+                    done = add(index, page, None) or done
+                else:
+                    held = page  # trimmed once the games before it are counted
+        if held is None:
+            total_pages = 0  # no games at all
+        else:
+            page_index = last_page
+            done = add(last_page, held, last_games) or done
+            del held
+
+    while not done and page_index < total_pages:
+        page_index += 1
+        page = await get_page(
+            session, semaphore, summoner_name, region, page_index, page_size, sizer
+        )
+        total_pages = page.get("pageInfo", {}).get("totalPages", 0)
+        done = add(page_index, page, last_games)
+        if progress is not None:
+            progress(page_index, total_pages)
+
+    logger.info(f"Found {new_games} new games in {page_index} page(s)")
+    return builder.build()
+
+
+async def get_lphistory(
+    summoner_name,
+    region,
+    page_limit=None,
+    concurrency=config.FETCH_CONCURRENCY,
+    use_cache=True,
+    session=None,
+    semaphore=None,
+    last_games: int | None = None,
+    since: datetime.datetime | None = None,
+    progress=None,
+    page_size: int | str = config.PAGE_SIZE,
+) -> data.History:
+    """
+    Asynchronously fetches a player's League of Legends LP history from the Mobalytics API.
+    If the player is in the store (see src/store.py) and use_cache is set, only the games
+    played since the last run are fetched, and the fetched games are added to the store.
+    Throws an exception if any page fails to fetch. If the first page has no data (e.g no
+    games played), an empty history is returned.
+
+    Set last_games or since to only return the last games or the games played since a
+    date. A player who is not stored then only has the pages holding those games fetched,
+    and is not stored.
+
+    Pass a session and a semaphore to share the connection pool and the limit of requests
+    in flight between several players; otherwise both are created for this call. If set,
+    progress(pages done, total pages) is called on the event loop as pages arrive, so it
+    must not block. page_size is the number of games per page, or "auto" to adapt it to
+    the endpoint (see src/pagesize.py).
+    """
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await get_lphistory(
+                summoner_name,
+                region,
+                page_limit,
+                concurrency,
+                use_cache,
+                session,
+                last_games=last_games,
+                since=since,
+                progress=progress,
+                page_size=page_size,
+            )
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(concurrency)
+    sizer = pagesize.get(page_size, region)
+
+    # A limited fetch is not the whole history, so it neither uses nor updates the store
+    use_cache = use_cache and page_limit is None
+    newest = store.newest(summoner_name, region) if use_cache else None
+
+    try:
+        if newest is not None:
+            logger.info(f"Refreshing stored history of {summoner_name}...")
+            new = await fetch_new_games(
+                session,
+                semaphore,
+                summoner_name,
+                region,
+                newest,
+                progress=progress,
+                sizer=sizer,
+            )
+        elif last_games is not None or since is not None:
+            # Only part of the history, so it is not stored
+            return await fetch_new_games(
+                session,
+                semaphore,
+                summoner_name,
+                region,
+                None,
+                last_games,
+                since,
+                progress,
+                sizer,
+            )
+        else:
+            new = await fetch_history(
+                session, semaphore, summoner_name, region, page_limit, progress, sizer
+            )
+
+    except Exception as e:
+        logger.error(f"Error when fetching pages for: {summoner_name}: {e}")
+        raise
+
+    if page_limit is not None:
+        return new
+    if new.newest is not None:
+        # Only the new games are written; a full fetch replaces what was stored
+        store.save_history(summoner_name, region, new, replace=newest is None)
+    if newest is None:
+        return new
+    return store.load_history(summoner_name, region, last_games, since)
+
+
+def fetch_apex_cutoffs(region: str) -> dict[str, int]:
     """
     Returns a dictionary mapping each apex tier to its cutoff value. Gets the cutoffs from
-    deeplol.gg. Will throw an exception if the request fails.
+    deeplol.gg and caches them. Will throw an exception if the request fails.
     """
     REGION_TO_CODE = {
         "NA": "NA1",
@@ -155,6 +524,8 @@ def get_apex_cutoffs(
         "TR": "TR1",
     }
 
+    import requests  # only needed here, so it is not imported by every fetch
+
     try:
         headers = {
             "sec-ch-ua": '"Not_A Brand";v="8", "Chromium";v="120", "Brave";v="120"',
@@ -165,10 +536,66 @@ def get_apex_cutoffs(
             "sec-ch-ua-platform": '"Linux"',
         }
         response = requests.get(
-            "https://b2c-api-cdn.deeplol.gg/common/tier-boundary", headers=headers
+            config.DEEPLOL_URL,
+            headers=headers,
+            timeout=10,
         )
         if response.status_code != 200:
             response.raise_for_status()
-        return response.json()["tier_boundary_solo"][REGION_TO_CODE[region.upper()]]
+        cutoffs = response.json()["tier_boundary_solo"][REGION_TO_CODE[region.upper()]]
     except Exception as e:
         raise Exception(f"Error fetching apex cutoffs: {e}")
+
+    cache.save_apex_cutoffs(region, cutoffs)
+    return cutoffs
+
+
+_refreshing: set[str] = set()  # regions whose apex cutoffs are being refreshed
+_refreshing_lock = threading.Lock()
+
+
+def _refresh_apex_cutoffs(region: str) -> None:
+    try:
+        fetch_apex_cutoffs(region)
+        logger.info(f"Refreshed cached apex cutoffs for {region}")
+    except Exception as e:
+        logger.warning(f"Could not refresh cached apex cutoffs: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(region)
+
+
+def get_apex_cutoffs(
+    region: str,
+    max_age: float = config.APEX_CUTOFFS_TTL,
+    force_refresh=False,
+    offline=False,
+) -> dict[str, int]:  # TODO: handle the case where no cutoffs exist
+    """
+    Returns a dictionary mapping each apex tier to its cutoff value. Cutoffs are cached
+    per region; cached cutoffs older than max_age seconds are still returned, but are
+    refetched in the background for the next run. Set force_refresh=True to always fetch
+    the cutoffs, or offline=True to never fetch them. Will throw an exception if the
+    cutoffs have to be fetched and the request fails, or if they are not cached when
+    offline.
+    """
+    cached = None if force_refresh else cache.load_apex_cutoffs(region)
+    if cached is None:
+        if offline:
+            raise APIError(f"No apex cutoffs cached for {region}")
+        return fetch_apex_cutoffs(region)
+
+    cutoffs, age = cached
+    if age >= max_age and not offline:
+        with _refreshing_lock:
+            # Only one refresh per region, however many players need the cutoffs
+            refresh = region not in _refreshing
+            _refreshing.add(region)
+        if refresh:
+            logger.info(
+                "Cached apex cutoffs are stale, refreshing in the background..."
+            )
+            # Not a daemon thread, so the refresh is allowed to finish before exiting
+            threading.Thread(target=_refresh_apex_cutoffs, args=(region,)).start()
+
+    return cutoffs
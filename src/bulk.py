@@ -0,0 +1,257 @@
+import asyncio
+import contextlib
+import datetime
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
+
+import src.api as api
+import src.config as config
+import src.data_processing as data
+import src.profiling as profiling
+from src.export import Exporter, ExportError
+from src.util import transform_riot_id
+
+__all__ = [
+    "read_players",
+    "bookmarked_players",
+    "fetch_players",
+    "summarize",
+    "render_players",
+]
+
+logger = logging.getLogger(__name__)
+
+APEX_TIERS = ("MASTER", "GRANDMASTER", "CHALLENGER")  # the tiers with apex cutoffs
+
+
+def read_players(path: str) -> list[tuple[str, str]]:
+    """
+    Reads players from a file with one "<riot ID> <region>" per line, e.g. "Faker#KR1 KR".
+    Empty lines are ignored.
+    """
+    players = []
+    with open(path, "r") as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if line == "":
+                continue
+            parts = line.rsplit(maxsplit=1)
+            if len(parts) != 2:
+                raise ValueError(f"{path}:{line_number}: expected '<riot ID> <region>'")
+            riot_id, region = parts
+            players.append((transform_riot_id(riot_id, region), region.upper()))
+
+    return players
+
+
+def bookmarked_players(folder: str = config.BOOKMARKS_FOLDER) -> list[tuple[str, str]]:
+    """
+    Returns the riot ID and region of every player bookmarked in a folder.
+    """
+    import src.select_player as select_player
+
+    return [
+        (riot_id, region) for _, riot_id, region in select_player.get_players(folder)
+    ]
+
+
+async def fetch_players(
+    players: list[tuple[str, str]],
+    concurrency: int,
+    use_cache=True,
+    last_games: int | None = None,
+    since: datetime.datetime | None = None,
+    page_size: int | str = config.PAGE_SIZE,
+) -> list[data.History | Exception]:
+    """
+    Fetches the LP history of every player through one connection pool, with at most
+    `concurrency` requests in flight in total. See api.get_lphistory for last_games,
+    since and page_size. Returns the history of each player in the order of `players`,
+    or the exception that made the fetch fail.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await asyncio.gather(
+            *[
+                api.get_lphistory(
+                    riot_id,
+                    region,
+                    use_cache=use_cache,
+                    session=session,
+                    semaphore=semaphore,
+                    last_games=last_games,
+                    since=since,
+                    page_size=page_size,
+                )
+                for riot_id, region in players
+            ],
+            return_exceptions=True,
+        )
+
+
+def summarize(points: data.Points, thresholds: list[dict]) -> dict:
+    """
+    Returns the current rank, peak rank, number of games and rolling winrate of a player.
+    """
+    if len(points) == 0:
+        return {"rank": "", "peak": "", "games": 0, "winrate": None}
+
+    data.insert_roll_avg_wr(points)
+    winrate = float(points.roll_avg_wr[-1])
+
+    rank_scale = data.RankScale(thresholds)
+
+    def to_rank(y) -> str:
+        return rank_scale.label(y, short=True, show_lp=True)
+
+    return {
+        "rank": to_rank(points.y[-1]),
+        "peak": to_rank(points.y.max()),
+        "games": len(points),
+        "winrate": winrate if not math.isnan(winrate) else None,
+    }
+
+
+def render(
+    riot_id: str, region: str, points: data.Points, thresholds: list[dict], output: str
+) -> str:
+    """
+    Renders the plot of a player to a file with the Agg backend. Runs in a worker
+    process, so matplotlib is only imported here.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import src.plot as plot
+
+    return plot.plot(riot_id, region, points, thresholds, output=output)
+
+
+def render_players(jobs: list[tuple], workers: int | None = None) -> list:
+    """
+    Renders the (riot ID, region, points, thresholds, output) jobs across a process pool,
+    using all cores by default. Returns the message of each job, or the exception that
+    made it fail.
+    """
+    # fork, since spawning would rerun the command line script in every worker
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(render, *job) for job in jobs]
+        return [future.exception() or future.result() for future in futures]
+
+
+def output_path(output_dir: str, riot_id: str, region: str, image_format: str) -> str:
+    file_name = f"{riot_id.replace('#', '-').replace('/', '_')}_{region}.{image_format}"
+    return os.path.join(output_dir, file_name)
+
+
+def format_summaries(players: list[tuple[str, str]], summaries: list) -> str:
+    """
+    Formats the summaries as a table, with the error message of players that failed.
+    """
+    header = ("Player", "Region", "Rank", "Peak", "Games", "Rolling WR")
+    rows = []
+    for (riot_id, region), summary in zip(players, summaries):
+        if isinstance(summary, Exception):
+            rows.append((riot_id, region, f"error: {summary}", "", "", ""))
+            continue
+        winrate = summary["winrate"]
+        rows.append(
+            (
+                riot_id,
+                region,
+                summary["rank"],
+                summary["peak"],
+                str(summary["games"]),
+                f"{winrate * 100:.1f}%" if winrate is not None else "N/A",
+            )
+        )
+
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in [header] + rows
+    )
+
+
+def run(
+    players: list[tuple[str, str]],
+    concurrency: int,
+    use_cache=True,
+    output_dir: str | None = None,
+    image_format="png",
+    workers: int | None = None,
+    export_path: str | None = None,
+    last_games: int | None = None,
+    since: datetime.datetime | None = None,
+    page_size: int | str = config.PAGE_SIZE,
+    refresh_cutoffs=False,
+) -> str:
+    """
+    Fetches and summarizes every player, returning the summary table. If output_dir is
+    set, the plot of every player is also rendered there in parallel. If export_path is
+    set, the games and thresholds of every player are exported there (see src/export.py).
+    Set refresh_cutoffs=True to fetch the apex cutoffs of each region once instead of
+    using the cached ones. Throws ExportError if the export cannot be started.
+    """
+    # Created first, so that a missing pyarrow is reported before fetching anything
+    exporter = contextlib.nullcontext()
+    if export_path is not None:
+        exporter = Exporter(export_path)
+
+    summaries = []
+    jobs = []
+    refreshed = set()  # regions whose apex cutoffs were fetched by this run
+    with exporter:
+        logger.info(f"Fetching {len(players)} players...")
+        with profiling.stage("fetch"):
+            results = asyncio.run(
+                fetch_players(
+                    players, concurrency, use_cache, last_games, since, page_size
+                )
+            )
+
+        for (riot_id, region), result in zip(players, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error getting data for {riot_id}: {result}")
+                summaries.append(result)
+                continue
+            try:
+                with profiling.stage(f"summarize {riot_id}"):
+                    thresholds = data.merge_thresholds(
+                        [result.thresholds],
+                        region,
+                        refresh_cutoffs=refresh_cutoffs and region not in refreshed,
+                    )
+                    if any(t["tier"] in APEX_TIERS for t in result.thresholds):
+                        refreshed.add(region)  # the cutoffs were needed, so fetched
+                    summaries.append(summarize(result.points, thresholds))
+            except Exception as e:
+                logger.error(f"Error summarizing {riot_id}: {e}")
+                summaries.append(e)
+                continue
+            if export_path is not None:
+                with profiling.stage(f"export {riot_id}"):
+                    exporter.add(riot_id, region, result.points, thresholds)
+            if output_dir is not None and len(result.points) > 0:
+                path = output_path(output_dir, riot_id, region, image_format)
+                jobs.append((riot_id, region, result.points, thresholds, path))
+
+    if len(jobs) > 0:
+        os.makedirs(output_dir, exist_ok=True)
+        logger.info(f"Rendering {len(jobs)} plots...")
+        with profiling.stage("render"):
+            messages = render_players(jobs, workers)
+        for job, message in zip(jobs, messages):
+            if isinstance(message, Exception):
+                logger.error(f"Error rendering {job[0]}: {message}")
+            else:
+                logger.info(message)
+
+    return format_summaries(players, summaries)
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import time
+
+import src.config as config
+
+__all__ = [
+    "load_apex_cutoffs",
+    "save_apex_cutoffs",
+    "load_page_size",
+    "save_page_size",
+    "bookmarks_key",
+    "load_bookmarked_players",
+    "save_bookmarked_players",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def _read_json(path: str) -> dict | None:
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache file {path}: {e}")
+        return None
+
+
+def _write_atomic(path: str, write) -> None:
+    """
+    Writes a file with write(file) to a temporary file and moves it into place, so that
+    an interrupted run never leaves a half-written cache file behind.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            write(file)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write cache file {path}: {e}")
+
+
+def _write_json(path: str, data) -> None:
+    _write_atomic(path, lambda file: json.dump(data, file))
+
+
+def _apex_cutoffs_path(region: str) -> str:
+    return os.path.join(config.CACHE_DIR, "apex_cutoffs", f"{region.upper()}.json")
+
+
+def load_apex_cutoffs(region: str) -> tuple[dict[str, int], float] | None:
+    """
+    Returns the cached apex cutoffs of a region together with their age in seconds, or
+    None if no cutoffs are cached.
+    """
+    cached = _read_json(_apex_cutoffs_path(region))
+    if cached is None:
+        return None
+    return cached["cutoffs"], time.time() - cached["fetchedAt"]
+
+
+def save_apex_cutoffs(region: str, cutoffs: dict[str, int]) -> None:
+    _write_json(
+        _apex_cutoffs_path(region), {"cutoffs": cutoffs, "fetchedAt": time.time()}
+    )
+
+
+def _page_size_path(region: str) -> str:
+    return os.path.join(config.CACHE_DIR, "page_size", f"{region.upper()}.json")
+
+
+def load_page_size(region: str) -> dict | None:
+    """
+    Returns what the adaptive page size learned about a region, see src/pagesize.py.
+    """
+    return _read_json(_page_size_path(region))
+
+
+def save_page_size(region: str, state: dict) -> None:
+    _write_json(_page_size_path(region), state)
+
+
+def _bookmarked_players_path() -> str:
+    return os.path.join(config.CACHE_DIR, "bookmarked_players.json")
+
+
+def bookmarks_key(bookmarks_file: str, folder: str) -> dict | None:
+    """
+    Returns what the players parsed from a bookmarks file depend on: the file, its
+    modification time and size, and the folder they were read from. Returns None if the
+    file cannot be read. Take the key before reading the file, so that a change made
+    while it is parsed invalidates what gets cached.
+    """
+    try:
+        stat = os.stat(bookmarks_file)
+    except OSError:
+        return None
+    return {
+        "file": os.path.abspath(bookmarks_file),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "folder": folder,
+    }
+
+
+def load_bookmarked_players(key: dict | None) -> list[tuple] | None:
+    """
+    Returns the players cached for a bookmarks_key, or None if they are not cached or
+    the bookmarks file changed since they were.
+    """
+    cached = _read_json(_bookmarked_players_path())
+    if cached is None or key is None or cached.get("key") != key:
+        return None
+    return [tuple(player) for player in cached["players"]]
+
+
+def save_bookmarked_players(key: dict | None, players: list[tuple]) -> None:
+    if key is not None:
+        _write_json(_bookmarked_players_path(), {"key": key, "players": players})
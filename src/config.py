@@ -1,9 +1,7 @@
 import os
 
-import pytz
-
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-LOCAL_TIMEZONE = pytz.timezone("Europe/Stockholm")
+LOCAL_TIMEZONE_NAME = "Europe/Stockholm"  # LOCAL_TIMEZONE is created on first use
 
 MASTER_VALUE = 2800  # the value of 0LP master
 RANK_COLORS = {
@@ -26,7 +24,30 @@ BOOKMARKS_FILE = os.path.join(
     "Default",
     "Bookmarks",
 )
+BOOKMARKS_FOLDER = (
+    "opgg"  # the bookmark folder holding the players, subfolders included
+)
 ICON_PATH = os.path.join(PROJECT_ROOT, "assets", "icon.png")
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME")
+    or os.path.join(
+        os.environ.get("HOME") or exit("$HOME env variable not set"), ".cache"
+    ),
+    "lol-lp",
+)
+STORE_PATH = os.path.join(  # the SQLite store of game histories, see src/store.py
+    os.environ.get("XDG_DATA_HOME")
+    or os.path.join(
+        os.environ.get("HOME") or exit("$HOME env variable not set"),
+        ".local",
+        "share",
+    ),
+    "lol-lp",
+    "history.sqlite3",
+)
+
+NOTIFICATION_ID = 938104  # every notification replaces the one with this ID
+NOTIFICATION_TIMEOUT = 2  # seconds to wait for a notification to be shown
 
 DMENU_LINES = 25
 DMENU_COLUMNS = 3
@@ -34,3 +55,51 @@ DMENU_PROMPT = "Select player"
 
 WR_WINDOW = 30
 LPDIFF_WINDOW = 15
+WINDOW_STEP = 5  # change of the rolling windows when pressing +/- in the plot
+CURSOR_MAX_FPS = 60  # the cursor handles at most this many mouse moves per second
+HOVER_TEXT_CACHE_SIZE = 4096  # number of hover texts kept by the cursor
+
+# The URLs can be pointed at a local stand-in, e.g. bench/mock_server.py
+MOBALYTICS_URL = os.environ.get(
+    "LOL_LP_MOBALYTICS_URL", "https://mobalytics.gg/api/lol/graphql/v1/query"
+)
+DEEPLOL_URL = os.environ.get(
+    "LOL_LP_DEEPLOL_URL", "https://b2c-api-cdn.deeplol.gg/common/tier-boundary"
+)
+LP_HISTORY_QUERY_HASH = (
+    "bade8e2e917de67ec76c0e30e82d2bc38c40fa0af1ed61a7dbe0a795cd49857f"
+)
+
+FETCH_CONCURRENCY = 4  # maximum number of page requests in flight
+PAGE_SIZE = 150  # games per page, or "auto" to adapt it per region (src/pagesize.py)
+PAGE_SIZE_MIN = 50  # the adaptive page size never shrinks below this
+PAGE_SIZE_MAX = 2000  # or grows above this
+PAGE_SIZE_SLOW = 5  # seconds a page may take before the adaptive page size shrinks
+PAGE_SIZE_PROBE_TIMEOUT = 3 * PAGE_SIZE_SLOW  # seconds before a larger page is rejected
+PAGE_SIZE_LIMIT_TTL = 7 * 24 * 60 * 60  # seconds before a failed page size is retried
+FETCH_RETRIES = 3  # retries of a page after a timeout, 429 or 5xx response
+RETRY_BACKOFF_BASE = 0.5  # seconds, doubled on every retry
+RETRY_BACKOFF_MAX = 10  # seconds
+RATE_LIMIT = 8  # requests per second to a single host
+RATE_LIMIT_BURST = 8  # requests that may be sent at once before RATE_LIMIT applies
+APEX_CUTOFFS_TTL = 24 * 60 * 60  # seconds before cached apex cutoffs are refetched
+
+WATCH_INTERVAL = 60  # default seconds between checks for new games with --watch
+WATCH_UPDATE_INTERVAL = 1  # seconds between checks of the window for polled games
+
+DAEMON_SOCKET = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or f"/tmp/lol-lp-{os.getuid()}", "lol-lp.sock"
+)
+DAEMON_POLL_INTERVAL = 0.05  # seconds the daemon handles window events between requests
+DAEMON_CONNECT_TIMEOUT = 1  # seconds to connect to the daemon's socket
+DAEMON_TIMEOUT = 300  # seconds to wait for the daemon to fetch and show a plot
+
+
+def __getattr__(name: str):
+    # pytz is slow to import and load, and only needed once dates are displayed
+    if name == "LOCAL_TIMEZONE":
+        import pytz
+
+        globals()[name] = pytz.timezone(LOCAL_TIMEZONE_NAME)
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,10 @@
+import functools
+import time
+
 import numpy as np
 
+import src.config as config
+
 
 class Cursor:
     """
@@ -11,13 +16,22 @@ class Cursor:
     def __init__(self, ax, line, points, y_converter):
         self.ax = ax
         self.line = line
-        self.x, self.y = line.get_data()
         self.points = points
         self.y_converter = y_converter
         self._last_index = None
         self.background = None
-        self.horizontal_line = ax.axhline(color="white", linestyle=":")
-        self.vertical_line = ax.axvline(color="white", linestyle=":")
+        self.info_text = functools.lru_cache(maxsize=config.HOVER_TEXT_CACHE_SIZE)(
+            self._info_text
+        )
+        self.min_interval = 1 / config.CURSOR_MAX_FPS
+        self._last_update = 0.0
+        self._pending_event = None
+        self._timer = ax.figure.canvas.new_timer()
+        self._timer.single_shot = True
+        self._timer.add_callback(self.on_timer)
+        # Animated artists are left out of normal draws and only drawn by blitting
+        self.horizontal_line = ax.axhline(color="white", linestyle=":", animated=True)
+        self.vertical_line = ax.axvline(color="white", linestyle=":", animated=True)
         props = dict(boxstyle="round", facecolor="black", alpha=0.5)
         self.text = ax.text(
             0.0125,
@@ -29,12 +43,27 @@ class Cursor:
             fontsize=12,
             verticalalignment="top",
             horizontalalignment="left",
+            animated=True,
         )
-        self._creating_background = False
+        self.set_cross_hair_visible(False)
         ax.figure.canvas.mpl_connect("draw_event", self.on_draw)
 
     def on_draw(self, event):
-        self.create_new_background()
+        """
+        Captures the background after every full draw, i.e. whenever the view changed.
+        The crosshair is animated, so the draw that just happened left it out and the
+        canvas can be copied as is instead of being redrawn without it.
+        """
+        self.background = self.ax.figure.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw_artists()  # the canvas is about to be shown, no need to blit
+
+    def invalidate(self):
+        """
+        Forgets the hover texts and the point under the mouse, after the points or the
+        rank scale changed.
+        """
+        self.info_text.cache_clear()
+        self._last_index = None
 
     def set_cross_hair_visible(self, visible):
         need_redraw = self.horizontal_line.get_visible() != visible
@@ -43,75 +72,106 @@ class Cursor:
         self.text.set_visible(visible)
         return need_redraw
 
-    def create_new_background(self):
-        if self._creating_background:
-            return
-        self._creating_background = True
-        self.set_cross_hair_visible(False)
-        self.ax.figure.canvas.draw()
-        self.background = self.ax.figure.canvas.copy_from_bbox(self.ax.bbox)
-        self.set_cross_hair_visible(True)
-        self._creating_background = False
+    def draw_artists(self):
+        self.ax.draw_artist(self.horizontal_line)
+        self.ax.draw_artist(self.vertical_line)
+        self.ax.draw_artist(self.text)
+
+    def draw_cross_hair(self):
+        """
+        Draws the crosshair on top of the background and blits it to the screen.
+        """
+        canvas = self.ax.figure.canvas
+        canvas.restore_region(self.background)
+        self.draw_artists()
+        canvas.blit(self.ax.bbox)
 
     def get_date_str(self, index):
-        date = self.points[index]["date"]
+        date = self.points.date(index)
         return date.strftime("%a %b %d")
 
-    def set_info_text(self, index):
+    def _info_text(self, index, n_points, wr_window, lpdiff_window) -> str:
+        """
+        Builds the hover text of a point. Memoized in __init__; the number of points and
+        the rolling windows are part of the key, since changing them changes the text.
+        """
         date_str = self.get_date_str(index)
-        patch = self.points[index]["patch"]
-        r_avg_lp_diff = self.points[index]["roll_avg_lpdiff"]
-        r_avg_wr = self.points[index]["roll_avg_wr"]
+        patch = self.points.patch(index)
+        r_avg_lp_diff = self.points.roll_avg_lpdiff[index]
+        r_avg_wr = self.points.roll_avg_wr[index]
 
-        if r_avg_lp_diff is not None:
+        if not np.isnan(r_avg_lp_diff):
             avg_lp_diff_str = "{:.1f}".format(r_avg_lp_diff)
         else:
             avg_lp_diff_str = "N/A"
 
-        if r_avg_wr is not None:
+        if not np.isnan(r_avg_wr):
             avg_wr_str = "{:.1f}%".format(r_avg_wr * 100)
         else:
             avg_wr_str = "N/A"
 
-        text = "({}): [{}]\nPatch: {}. ({} games ago)\nRolling avg WR: {}\nRolling avg LP +/-: {}".format(
+        return "({}): [{}]\nPatch: {}. ({} games ago)\nRolling avg WR: {}\nRolling avg LP +/-: {}".format(
             date_str,
-            self.y_converter(self.y[index]),
+            self.y_converter(self.points.y[index]),
             patch,
-            len(self.points) - index - 1,
+            n_points - index - 1,
             avg_wr_str,
             avg_lp_diff_str,
         )
 
+    def set_info_text(self, index):
+        text = self.info_text(
+            index,
+            len(self.points),
+            self.points.wr_window,
+            self.points.lpdiff_window,
+        )
         self.text.set_text(text)
 
     def on_mouse_move(self, event):
+        """
+        Handles at most one motion event per refresh interval. An event arriving sooner
+        is kept and handled by a timer, so the crosshair still ends up where the mouse
+        stopped.
+        """
+        now = time.perf_counter()
+        wait = self.min_interval - (now - self._last_update)
+        if wait > 0:
+            if self._pending_event is None:
+                self._timer.interval = max(1, int(wait * 1000))
+                self._timer.start()
+            self._pending_event = event
+            return
+
+        # A pending event is older than this one, so it must not be handled after it
+        self._timer.stop()
+        self._pending_event = None
+        self._last_update = now
+        self.update(event)
+
+    def on_timer(self):
+        event, self._pending_event = self._pending_event, None
+        if event is not None:
+            self._last_update = time.perf_counter()
+            self.update(event)
+
+    def update(self, event):
         if self.background is None:
-            self.create_new_background()
+            return  # the figure has not been drawn yet
         if not event.inaxes:
             self._last_index = None
             need_redraw = self.set_cross_hair_visible(False)
             if need_redraw:
-                self.ax.figure.canvas.restore_region(self.background)
-                self.ax.figure.canvas.blit(self.ax.bbox)
+                self.draw_cross_hair()
         else:
-            x, y = event.xdata, event.ydata
-            # Since the x-axis is inverted, we need to invert the search.
-            # Find the closest index to the inverted x position.
-            inverted_index = (
-                len(self.x) - np.searchsorted(self.x[::-1], x, side="left") - 1
-            )
-            index = np.clip(inverted_index, 0, len(self.x) - 1)
+            # x is the number of games ago, so the closest point is found by rounding
+            n_points = len(self.points)
+            games_ago = min(max(round(event.xdata), 0), n_points - 1)
+            index = n_points - 1 - games_ago
             if index != self._last_index:
                 self._last_index = index
-                x = self.x[index]
-                y = self.y[index]
-                self.horizontal_line.set_ydata([y])
-                self.vertical_line.set_xdata([x])
-                # Use the correct date string for the inverted index.
+                self.horizontal_line.set_ydata([self.points.y[index]])
+                self.vertical_line.set_xdata([games_ago])
                 self.set_info_text(index)
                 self.set_cross_hair_visible(True)
-                self.ax.figure.canvas.restore_region(self.background)
-                self.ax.draw_artist(self.horizontal_line)
-                self.ax.draw_artist(self.vertical_line)
-                self.ax.draw_artist(self.text)
-                self.ax.figure.canvas.blit(self.ax.bbox)
+                self.draw_cross_hair()
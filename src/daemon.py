@@ -0,0 +1,250 @@
+"""
+A resident process that keeps the HTTP session and the plotting stack loaded, and
+opens LP history windows on request over a Unix socket. lol-lp.py connects to it when
+it is running, so a plot only costs the fetch and building the figure.
+
+Requests and responses are single lines of JSON. The daemon answers once the window
+is shown or the request failed.
+"""
+
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import stat
+import threading
+from concurrent.futures import Future
+
+import src.config as config
+
+__all__ = ["request", "serve"]
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonError(Exception):
+    """The daemon could not handle a request."""
+
+    pass
+
+
+def request(riot_id: str, region: str, path=config.DAEMON_SOCKET, **options) -> str:
+    """
+    Asks the daemon to plot a player, passing the options on to the fetch (concurrency,
+    use_cache, refresh_cutoffs, last_games, since as a timestamp and page_size). Returns
+    the message to display once the window is shown. Throws OSError if no daemon is
+    listening on path, and DaemonError if the daemon failed to plot the player or did
+    not answer within config.DAEMON_TIMEOUT seconds.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(config.DAEMON_CONNECT_TIMEOUT)
+        client.connect(path)
+        client.settimeout(config.DAEMON_TIMEOUT)
+        message = {"riot_id": riot_id, "region": region} | options
+        try:
+            client.sendall(json.dumps(message).encode() + b"\n")
+            with client.makefile("rb") as file:
+                line = file.readline()
+        except TimeoutError:
+            raise DaemonError(
+                f"The daemon did not answer within {config.DAEMON_TIMEOUT}s"
+            )
+
+    if not line:
+        raise DaemonError("The daemon closed the connection")
+    response = json.loads(line)
+    if "error" in response:
+        raise DaemonError(response["error"])
+    return response["message"]
+
+
+def is_running(path=config.DAEMON_SOCKET) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(config.DAEMON_CONNECT_TIMEOUT)
+        try:
+            client.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+async def handle_connection(reader, writer, session, jobs: queue.Queue):
+    """
+    Fetches the player of a request on the daemon's event loop, then hands the points
+    over to the main thread to be plotted and answers with the result.
+    """
+    import asyncio
+    import datetime
+
+    import src.api as api
+    import src.data_processing as data
+
+    try:
+        line = await reader.readline()
+        if not line:
+            writer.close()  # a connection that sends nothing, like is_running
+            return
+        message = json.loads(line)
+        riot_id, region = message["riot_id"], message["region"].upper()
+        since = message.get("since")  # a timestamp
+        if since is not None:
+            since = datetime.datetime.fromtimestamp(since, datetime.timezone.utc)
+        logger.info(f"Request for {riot_id} ({region})")
+
+        history = await api.get_lphistory(
+            riot_id,
+            region,
+            concurrency=message.get("concurrency", config.FETCH_CONCURRENCY),
+            use_cache=message.get("use_cache", True),
+            session=session,
+            last_games=message.get("last_games"),
+            since=since,
+            page_size=message.get("page_size", config.PAGE_SIZE),
+        )
+        if history.newest is None:
+            response = {"message": "No data found."}
+        else:
+            # May fetch the apex cutoffs, which blocks
+            thresholds = await asyncio.get_running_loop().run_in_executor(
+                None,
+                lambda: data.merge_thresholds(
+                    [history.thresholds],
+                    region,
+                    refresh_cutoffs=message.get("refresh_cutoffs", False),
+                ),
+            )
+            shown = Future()
+            jobs.put((riot_id, region, history.points, thresholds, shown))
+            response = {"message": await asyncio.wrap_future(shown)}
+    except Exception as e:
+        logger.error(f"Error handling request: {e}")
+        response = {"error": str(e)}
+
+    try:
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+    except OSError as e:
+        logger.warning(f"Could not answer request: {e}")
+    finally:
+        writer.close()
+
+
+def run_server(path: str, jobs: queue.Queue, ready: Future) -> None:
+    """
+    Runs the event loop that accepts requests, with one HTTP session shared by all of
+    them. Runs in a background thread, since the windows need the main thread.
+    """
+    import asyncio
+
+    import aiohttp
+
+    async def main():
+        async with aiohttp.ClientSession() as session:
+            server = await asyncio.start_unix_server(
+                lambda reader, writer: handle_connection(reader, writer, session, jobs),
+                path,
+            )
+            os.chmod(path, 0o600)
+            ready.set_result(None)
+            async with server:
+                await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        if not ready.done():
+            ready.set_exception(e)
+        else:
+            logger.error(f"Daemon event loop stopped: {e}")
+
+
+def prepare_socket(path: str) -> None:
+    """
+    Creates the directory of the socket, and removes a socket left behind by a daemon
+    that did not exit cleanly. Throws DaemonError if a daemon is already running, or if
+    the directory is not private to the user, since it may be in /tmp where another
+    user could have created it first.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise DaemonError(f"{directory} must be a directory only accessible by you")
+    if is_running(path):
+        raise DaemonError(f"A daemon is already listening on {path}")
+    if os.path.exists(path):
+        logger.info(f"Removing stale socket {path}")
+        os.remove(path)
+
+
+def serve(path=config.DAEMON_SOCKET) -> None:
+    """
+    Runs the daemon until interrupted. Windows are created and their events handled
+    on the main thread, between checks for new requests.
+    """
+    # Everything a request needs is loaded up front, instead of by the first request
+    import matplotlib.pyplot as plt
+
+    import src.api
+    import src.data_processing
+    import src.plot as plot
+
+    plt.close(plt.figure())  # also loads the GUI toolkit
+
+    # Stop on SIGTERM like on Ctrl-C, so that the socket gets removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    prepare_socket(path)
+    jobs: queue.Queue = queue.Queue()
+    ready = Future()
+    threading.Thread(
+        target=run_server, args=(path, jobs, ready), daemon=True, name="lol-lp-server"
+    ).start()
+    ready.result()
+    logger.info(f"Listening on {path}")
+
+    # matplotlib only references the callbacks of a plot weakly, so the plots are kept
+    # here for as long as their window is open
+    plots = []
+
+    def forget(lp_plot):
+        plots.remove(lp_plot)
+        logger.info(f"Closed a window, {len(plots)} open")
+
+    try:
+        while True:
+            if len(plots) > 0:
+                plots[-1].fig.canvas.start_event_loop(config.DAEMON_POLL_INTERVAL)
+                try:
+                    job = jobs.get_nowait()
+                except queue.Empty:
+                    continue
+            else:
+                job = jobs.get()
+
+            *args, shown = job
+            try:
+                lp_plot = plot.make_plot(*args)
+                if lp_plot is None:
+                    shown.set_result("No games found.")
+                    continue
+                lp_plot.fig.canvas.mpl_connect(
+                    "close_event", lambda _, lp_plot=lp_plot: forget(lp_plot)
+                )
+                plots.append(lp_plot)
+                lp_plot.fig.show()
+                shown.set_result("")
+            except Exception as e:
+                logger.error(f"Error plotting: {e}")
+                shown.set_exception(e)
+    except KeyboardInterrupt:
+        logger.info("Stopping")
+    finally:
+        plt.close("all")
+        if os.path.exists(path):
+            os.remove(path)
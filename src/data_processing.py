@@ -1,14 +1,33 @@
+import bisect
+import datetime
+import functools
 import logging
 from sys import maxsize
 
+import numpy as np
+
+import src.config as config
+import src.profiling as profiling
 import src.util as util
-from src.config import MASTER_VALUE
 
 logger = logging.getLogger(__name__)
 
 
-def merge_thresholds(all_tresholds: list[list[dict]], region: str) -> list[dict]:
-    def set_apex_cutoffs(thresholds: list, region: str):
+def merge_thresholds(
+    all_tresholds: list[list[dict]],
+    region: str,
+    refresh_cutoffs=False,
+    cutoffs: dict[str, int] | None = None,
+    offline=False,
+) -> list[dict]:
+    """
+    Merges the thresholds of all pages and sets the apex tier boundaries. Set
+    refresh_cutoffs=True to bypass the apex cutoff cache, offline=True to only use the
+    cached apex cutoffs, or pass the apex cutoffs to use them instead of getting them
+    from deeplol.gg.
+    """
+
+    def set_apex_cutoffs(thresholds: list, region: str, cutoffs: dict | None):
         master = next((item for item in thresholds if item["tier"] == "MASTER"), None)
         grandmaster = next(
             (item for item in thresholds if item["tier"] == "GRANDMASTER"), None
@@ -18,15 +37,19 @@ def merge_thresholds(all_tresholds: list[list[dict]], region: str) -> list[dict]
         )
 
         if master or grandmaster or challenger:
-            from src.api import get_apex_cutoffs
+            if cutoffs is None:
+                from src.api import get_apex_cutoffs
 
-            cutoffs = get_apex_cutoffs(region)
+                with profiling.stage("apex_cutoffs"):
+                    cutoffs = get_apex_cutoffs(
+                        region, force_refresh=refresh_cutoffs, offline=offline
+                    )
             logger.info(f"Apex cutoffs: {cutoffs}")
-            gm_cutoff = MASTER_VALUE + cutoffs["grandmaster"]
-            chall_cutoff = MASTER_VALUE + cutoffs["challenger"]
+            gm_cutoff = config.MASTER_VALUE + cutoffs["grandmaster"]
+            chall_cutoff = config.MASTER_VALUE + cutoffs["challenger"]
 
             if master:
-                master["minValue"] = MASTER_VALUE
+                master["minValue"] = config.MASTER_VALUE
                 master["maxValue"] = gm_cutoff
 
             if master and grandmaster:
@@ -40,55 +63,331 @@ def merge_thresholds(all_tresholds: list[list[dict]], region: str) -> list[dict]
             logger.info("No apex tiers found, skipping cutoffs")
 
     logger.info("Merging thresholds...")
+    # Copied, since the bounds of the apex and highest tiers are changed below
+    thresholds = [dict(threshold) for threshold in unique_thresholds(all_tresholds)]
+
+    set_apex_cutoffs(thresholds, region, cutoffs)
+
+    if len(thresholds) > 0:
+        highest = max(thresholds[::-1], key=lambda x: (x["maxValue"]))
+        highest["maxValue"] = maxsize
+
+    return thresholds
+
+
+RESULT_LOST = 0
+RESULT_WON = 1
+RESULT_OTHER = -1  # e.g. remakes
+
+
+class Points:
+    """
+    The games of a player that have a rank, oldest first, stored column by column in
+    NumPy arrays. Patches are stored as codes into the small `patches` string table and
+    dates are only created for the games that are displayed.
+    """
+
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        y: np.ndarray,
+        results: np.ndarray,
+        lp_diffs: np.ndarray,
+        patch_codes: np.ndarray,
+        patches: list[str],
+    ):
+        self.timestamps = timestamps  # int64 seconds since the epoch
+        self.y = y  # int32
+        self.results = results  # int8, one of the RESULT_* codes
+        self.lp_diffs = lp_diffs  # float32, NaN where unknown
+        self.patch_codes = patch_codes  # int16 indices into patches
+        self.patches = patches
+        # Filled in by insert_roll_avg_lpdiff and insert_roll_avg_wr, NaN where unknown
+        self.roll_avg_lpdiff = np.full(len(y), np.nan)
+        self.roll_avg_wr = np.full(len(y), np.nan)
+        self.lpdiff_window = config.LPDIFF_WINDOW
+        self.wr_window = config.WR_WINDOW
+
+    def __len__(self) -> int:
+        return len(self.y)
+
+    @property
+    def x(self) -> np.ndarray:
+        """
+        The number of games ago each game was played.
+        """
+        return np.arange(len(self) - 1, -1, -1)
+
+    def date(self, index: int) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(
+            int(self.timestamps[index]), config.LOCAL_TIMEZONE
+        )
+
+    def patch(self, index: int) -> str:
+        return self.patches[self.patch_codes[index]]
+
+    def extend(self, other: "Points") -> None:
+        """
+        Appends the games of other, which were all played after the games of self. The
+        rolling averages are reset to NaN for the new games, call insert_roll_avg_lpdiff
+        and insert_roll_avg_wr to update them.
+        """
+        codes = np.array(
+            [
+                self.patches.index(patch) if patch in self.patches else -1
+                for patch in other.patches
+            ],
+            dtype=np.int16,
+        )
+        for code, patch in enumerate(other.patches):
+            if codes[code] == -1:
+                codes[code] = len(self.patches)
+                self.patches.append(patch)
+
+        self.timestamps = np.concatenate((self.timestamps, other.timestamps))
+        self.y = np.concatenate((self.y, other.y))
+        self.results = np.concatenate((self.results, other.results))
+        self.lp_diffs = np.concatenate((self.lp_diffs, other.lp_diffs))
+        self.patch_codes = np.concatenate((self.patch_codes, codes[other.patch_codes]))
+        unknown = np.full(len(other), np.nan)
+        self.roll_avg_lpdiff = np.concatenate((self.roll_avg_lpdiff, unknown))
+        self.roll_avg_wr = np.concatenate((self.roll_avg_wr, unknown))
+
+
+def get_y(values: np.ndarray, lps: np.ndarray) -> np.ndarray:
+    """
+    Converts rank values and LP to y values, where apex tiers are placed by their LP on
+    top of the value of 0LP master.
+    """
+    master_y = config.MASTER_VALUE + lps
+    # FIXME: This is a hack to avoid D1 promos appearing as master 0LP. maybe introduces bugs?
+    promo = (values == config.MASTER_VALUE) & (lps == 100)
+    return np.where(
+        values >= config.MASTER_VALUE,
+        np.where(promo, config.MASTER_VALUE - 1, master_y),
+        values,
+    ).astype(np.int32)
+
+
+def unique_thresholds(all_thresholds: list[list[dict]]) -> list[dict]:
+    """
+    Returns the thresholds of all lists without duplicate tier-division combinations,
+    keeping the first of each.
+    """
     thresholds = []
     seen = set()
-    for lst in all_tresholds:
+    for lst in all_thresholds:
         for threshold in lst:
-            # Create a unique key for each 'tier'-'division' combination
             key = (threshold["tier"], threshold["division"])
-
-            # Add the threshold only if the key hasn't been seen before
             if key not in seen:
                 thresholds.append(threshold)
                 seen.add(key)
+    return thresholds
 
-    set_apex_cutoffs(thresholds, region)
 
-    if len(thresholds) > 0:
-        highest = max(thresholds[::-1], key=lambda x: (x["maxValue"]))
-        highest["maxValue"] = maxsize
+def patch_season(patch: str) -> int:
+    """
+    Returns the season of a patch, e.g. 14 for 14.10.
+    """
+    return int(patch.split(".")[0])
 
-    return thresholds
+
+class History:
+    """
+    The ranked games of a player, the thresholds of the pages they came from (not merged
+    with merge_thresholds yet) and the start time of the newest game including
+    placements, which is where the next refresh continues from. season_thresholds holds
+    the thresholds of the pages by the season of their games, when known.
+    """
+
+    def __init__(
+        self,
+        points: Points,
+        thresholds: list[dict],
+        newest: int | None,
+        season_thresholds: dict[int, list[dict]] | None = None,
+    ):
+        self.points = points
+        self.thresholds = thresholds
+        self.newest = newest
+        self.season_thresholds = season_thresholds or {}
 
 
-def value_to_rank(
-    y, _, thresholds: list[dict], short=False, show_lp=False, minor_tick=False
-) -> str:
+class HistoryBuilder:
     """
-    Translates a value to a rank string. Set short=True to output a short string
+    Extracts the points of a history one page at a time and in any order, so that each
+    page can be dropped as soon as it has been added.
     """
 
-    def is_highest(tier: str) -> bool:
-        return tier == max(thresholds, key=lambda x: x["maxValue"])["tier"]
+    RESULT_CODES = {"WON": RESULT_WON, "LOST": RESULT_LOST}
 
-    def roman_to_int(s: str) -> int:
-        return {"IV": 4, "III": 3, "II": 2, "I": 1}[s]
+    def __init__(self):
+        self._chunks: dict[int, tuple] = {}
+        self._patch_table: dict[str, int] = {}
+        self._thresholds: dict[int, list[dict]] = {}
+        self._seasons: dict[int, int | None] = {}
+        self.newest: int | None = None
 
-    for tier in thresholds:
-        if y >= tier["minValue"] and y < (
-            tier["maxValue"]
-            + (1 if is_highest(tier["tier"]) and util.is_apex(tier["tier"]) else 0)
-        ):
-            lp = (
-                y - tier["minValue"]
-                if not util.is_apex(tier["tier"])
-                else y - MASTER_VALUE
+    def add_page(self, page_index: int, page: dict) -> None:
+        """
+        Adds a page, where pages with a higher index hold older games.
+        """
+        self._chunks[page_index] = self._extract(page["items"])
+        self._thresholds[page_index] = page["thresholds"]
+        # The season of the page's newest game, whose thresholds the page holds
+        self._seasons[page_index] = (
+            patch_season(page["items"][0]["patch"]) if page["items"] else None
+        )
+        for item in page["items"]:
+            if self.newest is None or item["startedAt"] > self.newest:
+                self.newest = item["startedAt"]
+
+    @staticmethod
+    def is_ranked(item: dict) -> bool:
+        """
+        Returns whether a game has a rank, which placement games do not.
+        """
+        return (item["lp"]["after"] or item["lp"]["before"]) is not None
+
+    def _extract(self, items: list[dict]) -> tuple:
+        timestamps, values, lps, results, lp_diffs, patch_codes = [], [], [], [], [], []
+        for item in reversed(items):
+            lp = item["lp"]["after"] or item["lp"]["before"]
+            if lp is None:
+                # If there was no lp before and after then the game was a placement game
+                continue
+
+            timestamps.append(item["startedAt"])
+            values.append(lp["value"])
+            lps.append(lp["lp"])
+            results.append(self.RESULT_CODES.get(item["result"], RESULT_OTHER))
+            lp_diff = item["lp"]["lpDiff"]
+            lp_diffs.append(lp_diff if lp_diff is not None else np.nan)
+            patch_codes.append(
+                self._patch_table.setdefault(item["patch"], len(self._patch_table))
             )
-            if util.is_apex(tier["tier"]) and minor_tick:
-                return f"{int(lp)} LP"
-            lp_str = f" {int(lp)} LP" if show_lp else ""
-            if short:
-                return f"{util.short_tier(tier['tier'])}{roman_to_int(tier['division'])}{lp_str}"
-            else:
-                return f"{tier['tier']} {tier['division']}{lp_str}"
-    return ""
+
+        return (
+            np.array(timestamps, dtype=np.int64),
+            get_y(np.array(values, dtype=np.int32), np.array(lps, dtype=np.int32)),
+            np.array(results, dtype=np.int8),
+            np.array(lp_diffs, dtype=np.float32),
+            np.array(patch_codes, dtype=np.int16),
+        )
+
+    def build(self) -> History:
+        """
+        Returns the history of the pages added so far, oldest game first.
+        """
+        order = sorted(self._chunks, reverse=True)
+        chunks = [self._chunks[i] for i in order] or [self._extract([])]
+        columns = [np.concatenate(column) for column in zip(*chunks)]
+        points = Points(*columns, patches=list(self._patch_table))
+        thresholds = unique_thresholds([self._thresholds[i] for i in reversed(order)])
+        by_season: dict[int, list[list[dict]]] = {}
+        for i in reversed(order):
+            if self._seasons[i] is not None:
+                by_season.setdefault(self._seasons[i], []).append(self._thresholds[i])
+        season_thresholds = {
+            season: unique_thresholds(lists) for season, lists in by_season.items()
+        }
+        return History(points, thresholds, self.newest, season_thresholds)
+
+
+def extract_points(pages: list) -> Points:
+    builder = HistoryBuilder()
+    for page_index in reversed(range(len(pages))):
+        builder.add_page(page_index, pages[page_index])
+    return builder.build().points
+
+
+def rolling_mean(values: np.ndarray, counts: np.ndarray, window: int) -> np.ndarray:
+    """
+    Returns the mean of the last `window` values seen by each game, where counts[i] is
+    the number of values seen by game i, or NaN if fewer than `window` values were seen.
+    Runs in O(n) using cumulative sums.
+    """
+    sums = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    means = np.full(len(counts), np.nan)
+    ready = counts >= window
+    seen = counts[ready]
+    means[ready] = (sums[seen] - sums[seen - window]) / window
+    return means
+
+
+def insert_roll_avg_lpdiff(points: Points, window=config.LPDIFF_WINDOW) -> None:
+    logger.info("Calculating rolling average LP diff...")
+    lp_diffs = np.abs(points.lp_diffs.astype(np.float64))
+    counted = (lp_diffs > 10) & (lp_diffs < 100)  # false for NaN
+    won = counted & (points.results == RESULT_WON)
+    lost = counted & (points.results == RESULT_LOST)
+
+    avg_win = rolling_mean(lp_diffs[won], np.cumsum(won), window)
+    avg_loss = rolling_mean(lp_diffs[lost], np.cumsum(lost), window)
+    points.roll_avg_lpdiff = avg_win - avg_loss  # NaN unless both windows are full
+    points.lpdiff_window = window
+
+
+def insert_roll_avg_wr(points: Points, window=config.WR_WINDOW) -> None:
+    logger.info("Calculating rolling average winrate...")
+    decided = (points.results == RESULT_WON) | (points.results == RESULT_LOST)
+    wins = points.results[decided] == RESULT_WON
+
+    points.roll_avg_wr = rolling_mean(wins, np.cumsum(decided), window)
+    points.wr_window = window
+
+
+class RankScale:
+    """
+    Translates values to rank strings using merged thresholds. The thresholds are sorted
+    once so that each lookup is a binary search, and labels are memoized since the tick
+    formatters and the cursor ask for the same values over and over.
+    """
+
+    def __init__(self, thresholds: list[dict], cache_size=4096):
+        highest = (
+            max(thresholds, key=lambda x: x["maxValue"])["tier"] if thresholds else None
+        )
+
+        self.tiers = sorted(thresholds, key=lambda x: x["minValue"])
+        self._lower_bounds = [tier["minValue"] for tier in self.tiers]
+        self._upper_bounds = [
+            tier["maxValue"]
+            + (1 if tier["tier"] == highest and util.is_apex(tier["tier"]) else 0)
+            for tier in self.tiers
+        ]
+        self.label = functools.lru_cache(maxsize=cache_size)(self._label)
+
+    def find(self, y) -> dict | None:
+        """
+        Returns the threshold that the value is in, or None if it is outside all of them.
+        """
+        i = bisect.bisect_right(self._lower_bounds, y) - 1
+        if i >= 0 and y < self._upper_bounds[i]:
+            return self.tiers[i]
+        return None
+
+    def _label(self, y, short=False, show_lp=False, minor_tick=False) -> str:
+        """
+        Translates a value to a rank string. Set short=True to output a short string
+        """
+
+        def roman_to_int(s: str) -> int:
+            return {"IV": 4, "III": 3, "II": 2, "I": 1}[s]
+
+        tier = self.find(y)
+        if tier is None:
+            return ""
+
+        lp = (
+            y - tier["minValue"]
+            if not util.is_apex(tier["tier"])
+            else y - config.MASTER_VALUE
+        )
+        if util.is_apex(tier["tier"]) and minor_tick:
+            return f"{int(lp)} LP"
+        lp_str = f" {int(lp)} LP" if show_lp else ""
+        if short:
+            return f"{util.short_tier(tier['tier'])}{roman_to_int(tier['division'])}{lp_str}"
+        else:
+            return f"{tier['tier']} {tier['division']}{lp_str}"
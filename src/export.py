@@ -0,0 +1,187 @@
+"""
+Exports LP histories to columnar files for analysis in pandas, DuckDB or Polars. The
+games of every player go to one file, Parquet or Arrow IPC depending on its extension,
+and the merged thresholds of every player to a second file next to it. pyarrow is
+optional and only imported once an Exporter is created.
+"""
+
+import json
+import logging
+import os
+
+import src.config as config
+import src.data_processing as data
+
+__all__ = ["Exporter", "ExportError", "thresholds_path"]
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+
+class ExportError(Exception):
+    """The histories could not be exported."""
+
+    pass
+
+
+def thresholds_path(path: str) -> str:
+    """
+    Returns the path of the thresholds file written next to the games file at path,
+    e.g. roster.thresholds.parquet for roster.parquet.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.thresholds{extension}"
+
+
+class Exporter:
+    """
+    Writes the games of one player at a time as a record batch (a row group in Parquet),
+    so that exporting many players never holds more than one of them in Arrow memory.
+    Arrow IPC files are written uncompressed, so they can be memory-mapped when read.
+    Files are written next to their destination and moved into place by close(), so an
+    interrupted export leaves no half-written file behind.
+    """
+
+    def __init__(self, path: str):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in FORMATS:
+            raise ExportError(
+                f"Unknown export format {extension or path!r}, "
+                f"use one of {', '.join(FORMATS)}"
+            )
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ExportError("Exporting needs pyarrow, install it with pip")
+
+        self.pa = pa
+        self.path = path
+        self.format = FORMATS[extension]
+        self.games_schema = pa.schema(
+            [
+                ("riot_id", pa.string()),
+                ("region", pa.string()),
+                # Parquet has no second resolution, so both formats use ms
+                ("started_at", pa.timestamp("ms", tz="UTC")),
+                ("y", pa.int32()),
+                ("result", pa.int8()),
+                ("lp_diff", pa.float32()),
+                ("patch", pa.string()),
+                ("roll_avg_lpdiff", pa.float64()),
+                ("roll_avg_wr", pa.float64()),
+            ],
+            metadata={
+                "result_codes": json.dumps(
+                    {
+                        "won": data.RESULT_WON,
+                        "lost": data.RESULT_LOST,
+                        "other": data.RESULT_OTHER,
+                    }
+                ),
+                "lpdiff_window": str(config.LPDIFF_WINDOW),
+                "wr_window": str(config.WR_WINDOW),
+            },
+        )
+        self.thresholds_schema = pa.schema(
+            [
+                ("riot_id", pa.string()),
+                ("region", pa.string()),
+                ("tier", pa.string()),
+                ("division", pa.string()),
+                ("min_value", pa.int64()),
+                ("max_value", pa.int64()),
+            ]
+        )
+        self._thresholds = {name: [] for name in self.thresholds_schema.names}
+        self.players = 0
+        self.games = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = self._open(f"{path}.tmp", self.games_schema)
+
+    def _open(self, path: str, schema):
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetWriter(path, schema)
+        return self.pa.ipc.new_file(path, schema)
+
+    def add(
+        self, riot_id: str, region: str, points: data.Points, thresholds: list[dict]
+    ) -> None:
+        """
+        Writes the games of a player with their rolling averages, which are computed
+        here, and keeps the merged thresholds for close().
+        """
+        pa = self.pa
+        data.insert_roll_avg_lpdiff(points)
+        data.insert_roll_avg_wr(points)
+
+        count = len(points)
+        batch = pa.record_batch(
+            [
+                pa.repeat(pa.scalar(riot_id), count),
+                pa.repeat(pa.scalar(region), count),
+                pa.array(points.timestamps * 1000, pa.int64()).cast(
+                    self.games_schema.field("started_at").type
+                ),
+                pa.array(points.y, pa.int32()),
+                pa.array(points.results, pa.int8()),
+                pa.array(points.lp_diffs, pa.float32(), from_pandas=True),
+                pa.array(points.patches, pa.string()).take(
+                    pa.array(points.patch_codes, pa.int16())
+                ),
+                pa.array(points.roll_avg_lpdiff, pa.float64(), from_pandas=True),
+                pa.array(points.roll_avg_wr, pa.float64(), from_pandas=True),
+            ],
+            schema=self.games_schema,
+        )
+        self._writer.write_batch(batch)
+
+        for threshold in thresholds:
+            self._thresholds["riot_id"].append(riot_id)
+            self._thresholds["region"].append(region)
+            self._thresholds["tier"].append(threshold["tier"])
+            self._thresholds["division"].append(threshold["division"])
+            self._thresholds["min_value"].append(threshold["minValue"])
+            self._thresholds["max_value"].append(threshold["maxValue"])
+
+        self.players += 1
+        self.games += count
+
+    def close(self) -> None:
+        """
+        Finishes the games file and writes the thresholds file.
+        """
+        self._writer.close()
+        os.replace(f"{self.path}.tmp", self.path)
+
+        path = thresholds_path(self.path)
+        writer = self._open(f"{path}.tmp", self.thresholds_schema)
+        writer.write_table(
+            self.pa.table(self._thresholds, schema=self.thresholds_schema)
+        )
+        writer.close()
+        os.replace(f"{path}.tmp", path)
+        logger.info(
+            f"Exported {self.games} games of {self.players} player(s) to {self.path}"
+        )
+
+    def abort(self) -> None:
+        """
+        Stops the export and removes what was written so far.
+        """
+        try:
+            self._writer.close()
+        finally:
+            os.remove(f"{self.path}.tmp")
+
+    def __enter__(self) -> "Exporter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
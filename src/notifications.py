@@ -0,0 +1,188 @@
+"""
+Desktop notifications, shown as one notification that every message replaces. Messages
+are sent in order by a background thread, so sending never blocks the caller, and a
+message still waiting when a newer one arrives is dropped since it would be replaced
+right away. The thread keeps one D-Bus session connection open if jeepney is installed,
+and runs notify-send for each message otherwise.
+"""
+
+import atexit
+import logging
+import queue
+import subprocess
+import threading
+
+import src.config as config
+
+__all__ = ["send", "close"]
+
+logger = logging.getLogger(__name__)
+
+
+class DBusBackend:
+    """
+    Sends notifications over a persistent connection to the session bus.
+    """
+
+    def __init__(self):
+        from jeepney import DBusAddress
+        from jeepney.io.blocking import open_dbus_connection
+
+        self.address = DBusAddress(
+            "/org/freedesktop/Notifications",
+            bus_name="org.freedesktop.Notifications",
+            interface="org.freedesktop.Notifications",
+        )
+        self.connection = open_dbus_connection(bus="SESSION")
+
+    def send(self, message: str, duration: int) -> None:
+        from jeepney import new_method_call
+        from jeepney.wrappers import unwrap_msg
+
+        call = new_method_call(
+            self.address,
+            "Notify",
+            "susssasa{sv}i",
+            (
+                "lol-lp",
+                config.NOTIFICATION_ID,
+                "",
+                " ",
+                message,
+                [],
+                {"urgency": ("y", 0), "category": ("s", "no_title")},
+                duration,
+            ),
+        )
+        reply = self.connection.send_and_get_reply(
+            call, timeout=config.NOTIFICATION_TIMEOUT
+        )
+        unwrap_msg(reply)  # throws if the call failed
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class NotifySendBackend:
+    """
+    Sends each notification by running notify-send.
+    """
+
+    def send(self, message: str, duration: int) -> None:
+        subprocess.run(
+            [
+                "notify-send",
+                "-t",
+                str(duration),
+                "-u",
+                "low",
+                "-c",
+                "no_title",
+                " ",
+                message,
+                "-r",
+                str(config.NOTIFICATION_ID),
+            ],
+            timeout=config.NOTIFICATION_TIMEOUT,
+        )
+
+    def close(self) -> None:
+        pass
+
+
+def open_backend():
+    """
+    Returns the D-Bus backend, or the notify-send backend if jeepney is not installed
+    or the session bus cannot be reached.
+    """
+    try:
+        return DBusBackend()
+    except Exception as e:  # ImportError, or no session bus
+        logger.debug(f"Using notify-send for notifications: {e}")
+        return NotifySendBackend()
+
+
+class Notifier:
+    """
+    Sends the messages passed to send() from a background thread.
+    """
+
+    def __init__(self):
+        self.messages: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self.run, daemon=True, name="lol-lp-notify"
+        )
+        self._thread.start()
+
+    def send(self, message: str, duration: int) -> None:
+        self.messages.put((message, duration))
+
+    def run(self) -> None:
+        backend = open_backend()
+        while (item := self.next_message()) is not None:
+            backend = self.deliver(backend, *item)
+        backend.close()
+
+    def next_message(self) -> tuple[str, int] | None:
+        """
+        Waits for a message and returns the newest one waiting, or None to stop.
+        """
+        item = self.messages.get()
+        while item is not None:
+            try:
+                newer = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if newer is None:
+                self.messages.put(None)  # stop once item is sent
+                break
+            item = newer
+        return item
+
+    def deliver(self, backend, message: str, duration: int):
+        """
+        Sends a message, switching to notify-send if D-Bus fails. Returns the backend
+        to use for the next messages.
+        """
+        try:
+            backend.send(message, duration)
+            return backend
+        except Exception as e:
+            if isinstance(backend, NotifySendBackend):
+                logger.warning(f"Could not show notification: {e}")
+                return backend
+            logger.warning(f"D-Bus notification failed, using notify-send: {e}")
+            backend.close()
+        return self.deliver(NotifySendBackend(), message, duration)
+
+    def close(self, timeout: float = config.NOTIFICATION_TIMEOUT) -> None:
+        """
+        Sends the messages still waiting and stops the thread.
+        """
+        self.messages.put(None)
+        self._thread.join(timeout)
+
+
+_notifier: Notifier | None = None
+_lock = threading.Lock()
+
+
+def send(message: str, duration: int) -> None:
+    """
+    Shows a message for duration milliseconds in place of the previous one. The first
+    message starts the sending thread, which gets to finish when the program exits.
+    """
+    global _notifier
+    with _lock:
+        if _notifier is None:
+            _notifier = Notifier()
+            atexit.register(close)
+    _notifier.send(message, duration)
+
+
+def close() -> None:
+    global _notifier
+    with _lock:
+        notifier, _notifier = _notifier, None
+    if notifier is not None:
+        notifier.close()
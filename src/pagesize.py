@@ -0,0 +1,123 @@
+import logging
+import time
+
+import src.cache as cache
+import src.config as config
+
+__all__ = ["PageSize", "AdaptivePageSize", "get", "AUTO"]
+
+logger = logging.getLogger(__name__)
+
+AUTO = "auto"  # the page size setting that selects AdaptivePageSize
+START_SIZE = 150  # the size the adaptive page size starts from
+
+_adaptive: dict[str, "AdaptivePageSize"] = {}
+
+
+class PageSize:
+    """
+    The number of games requested per page. This one stays fixed, see
+    AdaptivePageSize for one that adapts to the endpoint.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def probe(self) -> int | None:
+        """
+        Returns a larger size to request the first page of a full fetch with, or None
+        to use the current size.
+        """
+        return None
+
+    def record(self, size: int, elapsed: float, retries: int) -> None:
+        """
+        Called with the time a page of `size` games took to arrive, not counting the
+        failed attempts, and how many attempts failed before.
+        """
+        pass
+
+    def rejected(self, size: int, accepted: int | None = None) -> None:
+        """
+        Called when the endpoint failed a page of `size` games, or sent only `accepted`
+        games on a page that was not the last.
+        """
+        pass
+
+
+class AdaptivePageSize(PageSize):
+    """
+    A page size that grows while the endpoint keeps up and shrinks when it does not,
+    remembered per region in the cache. Every full fetch probes a larger size with its
+    first page: twice the current size, up to config.PAGE_SIZE_MAX, or halfway to the
+    smallest size the endpoint failed or was slow with, until that is less than 10%
+    larger. Pages that are slower than config.PAGE_SIZE_SLOW seconds or need retries
+    halve the size. A failed size stops being probed for config.PAGE_SIZE_LIMIT_TTL
+    seconds, in case the failure was a coincidence.
+    """
+
+    def __init__(self, region: str):
+        state = cache.load_page_size(region) or {}
+        self.region = region
+        self.size = state.get("size", START_SIZE)
+        self.limit = state.get("limit")  # the smallest size the endpoint failed
+        self.limit_at = state.get("limitAt", 0.0)
+        if self.limit is not None and time.time() - self.limit_at > (
+            config.PAGE_SIZE_LIMIT_TTL
+        ):
+            self.limit = None
+
+    def probe(self) -> int | None:
+        size = min(self.size * 2, config.PAGE_SIZE_MAX)
+        if self.limit is not None:
+            size = min(size, (self.size + self.limit) // 2)
+        return size if size * 10 >= self.size * 11 else None
+
+    def record(self, size: int, elapsed: float, retries: int) -> None:
+        if elapsed > config.PAGE_SIZE_SLOW or retries > 0:
+            if elapsed > config.PAGE_SIZE_SLOW:
+                self._limit(size)
+            smaller = max(config.PAGE_SIZE_MIN, size // 2)
+            if smaller < self.size:
+                logger.info(
+                    f"Page of {size} games took {elapsed:.1f}s after {retries} "
+                    f"retries, using {smaller} games per page from now on"
+                )
+                self.size = smaller
+            self._save()
+        elif size > self.size and (self.limit is None or size < self.limit):
+            logger.info(f"Using {size} games per page from now on")
+            self.size = size
+            self._save()
+
+    def rejected(self, size: int, accepted: int | None = None) -> None:
+        self._limit(size)
+        if accepted is not None:
+            self.size = max(config.PAGE_SIZE_MIN, accepted)
+        self.size = min(self.size, self.limit - 1)
+        logger.info(f"Pages of {size} games are not accepted, using {self.size}")
+        self._save()
+
+    def _limit(self, size: int) -> None:
+        self.limit = size if self.limit is None else min(self.limit, size)
+        self.limit_at = time.time()
+
+    def _save(self) -> None:
+        cache.save_page_size(
+            self.region,
+            {"size": self.size, "limit": self.limit, "limitAt": self.limit_at},
+        )
+
+
+def get(setting: int | str, region: str) -> PageSize:
+    """
+    Returns the page size for a setting like config.PAGE_SIZE: a number of games, or
+    AUTO for the adaptive page size of the region, which is shared by all fetches in the
+    process.
+    """
+    if setting != AUTO:
+        return PageSize(int(setting))
+    region = region.upper()
+    if region not in _adaptive:
+        _adaptive[region] = AdaptivePageSize(region)
+    return _adaptive[region]
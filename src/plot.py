@@ -1,6 +1,5 @@
-import datetime
 import logging
-from collections import deque
+import math
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -9,6 +8,7 @@ from matplotlib.ticker import FuncFormatter
 import src.config as config
 import src.cursor as cursor
 import src.data_processing as data
+import src.profiling as profiling
 
 logger = logging.getLogger(__name__)
 
@@ -31,9 +31,9 @@ def get_major_ticks(y_values: list, thresholds: list[dict]) -> list:
     return ticks
 
 
-def color_rank_intervals(thresholds: list[dict], min_y, max_y):
+def color_rank_intervals(thresholds: list[dict], min_y, max_y, ax) -> list:
     """
-    Colors the graph with each rank's color
+    Colors the graph with each rank's color. Returns the colored spans.
     """
 
     def is_highest(tier: str) -> bool:
@@ -42,6 +42,7 @@ def color_rank_intervals(thresholds: list[dict], min_y, max_y):
     def is_lowest(tier: str) -> bool:
         return tier == min(thresholds, key=lambda x: x["minValue"])["tier"]
 
+    spans = []
     unique_tiers = {item["tier"] for item in thresholds}
     for tier in unique_tiers:
         upper_bound = max(
@@ -56,35 +57,45 @@ def color_rank_intervals(thresholds: list[dict], min_y, max_y):
         if is_lowest(tier):
             lower_bound = min(min_y, lower_bound)
 
-        plt.axhspan(
-            lower_bound, upper_bound, facecolor=config.RANK_COLORS[tier], alpha=0.8
+        spans.append(
+            ax.axhspan(
+                lower_bound, upper_bound, facecolor=config.RANK_COLORS[tier], alpha=0.8
+            )
         )
 
+    return spans
+
 
-def insert_patch_lines(points: list, ax, min_distance=4) -> list:
+def insert_patch_lines(
+    points: data.Points, ax, min_distance=4, artists: list | None = None
+) -> list:
     """
     Finds the indices of the points where a new patch is introduced and inserts
     a vertical line at that point with a text label, only if they are not too close together.
 
     Labels are only added to the leftmost line if lines are closer than min_distance to each other.
 
-    :param points: List of point dictionaries with a 'patch' key.
+    :param points: The points of the plot.
     :param ax: The axis object of the plot.
     :param min_distance: The minimum distance allowed between text labels.
+    :param artists: If given, the lines and labels that are added are appended to it.
     :return: List of tuples with the index and patch value where lines are inserted.
     """
+    codes = points.patch_codes
     patch_lines = [
-        (len(points) - (i + 1), points[i]["patch"])
-        for i in range(1, len(points))
-        if points[i]["patch"] != points[i - 1]["patch"]
+        (len(points) - (i + 1), points.patch(i))
+        for i in np.flatnonzero(codes[1:] != codes[:-1]) + 1
     ]
 
+    added = []
     for i, (x_pos, patch) in enumerate(patch_lines):
-        plt.axvline(
-            x_pos,
-            color="black",
-            linestyle=":",
-            linewidth=0.3,
+        added.append(
+            ax.axvline(
+                x_pos,
+                color="black",
+                linestyle=":",
+                linewidth=0.3,
+            )
         )
 
         # Check if this is the last patch line or if the next patch line is further away than min_distance
@@ -92,110 +103,129 @@ def insert_patch_lines(points: list, ax, min_distance=4) -> list:
             (x_pos) - (patch_lines[i + 1][0] + 1) >= min_distance
         ):
             # Add text at the vertical line
-            plt.text(
-                x_pos - 0.05,  # Slight offset in x-direction for clarity
-                ax.get_ylim()[1],  # Set y position at the top of the plot
-                patch,  # The text label
-                rotation=90,  # Vertical text
-                verticalalignment="top",  # Align text to the top of plot
-                fontsize=8,
+            added.append(
+                ax.text(
+                    x_pos - 0.05,  # Slight offset in x-direction for clarity
+                    ax.get_ylim()[1],  # Set y position at the top of the plot
+                    patch,  # The text label
+                    rotation=90,  # Vertical text
+                    verticalalignment="top",  # Align text to the top of plot
+                    fontsize=8,
+                )
             )
 
+    if artists is not None:
+        artists.extend(added)
     return patch_lines
 
 
-def extract_points(pages: list) -> list[dict]:
-    def get_y(item):
-        if item["lp"]["after"] is not None:
-            value = item["lp"]["after"]["value"]
-            lp = item["lp"]["after"]["lp"]
-        elif item["lp"]["before"] is not None:
-            value = item["lp"]["before"]["value"]
-            lp = item["lp"]["before"]["lp"]
-        else:
-            # If there was no lp before and after then the game was a placement game
-            return None
-
-        if value > config.MASTER_VALUE:
-            y = config.MASTER_VALUE + lp
-        elif value == config.MASTER_VALUE:
-            if lp == 100:
-                # FIXME: This is a hack to avoid D1 promos appearing as master 0LP. maybe introduces bugs?
-                y = config.MASTER_VALUE - 1
-            else:
-                y = config.MASTER_VALUE + lp
-        else:
-            y = value
-
-        return y
-
-    points = []
-    for page in reversed(pages):
-        for item in reversed(page["items"]):
-            y_value = get_y(item)
-            if y_value is None:
-                continue
-
-            point = {
-                "y": y_value,
-                "date": datetime.datetime.fromtimestamp(
-                    item["startedAt"], config.LOCAL_TIMEZONE
-                ),
-                "patch": item["patch"],
-                "result": item["result"],
-                "lp_diff": item["lp"]["lpDiff"],
-            }
-            points.append(point)
-
-    return points
-
-
-def insert_roll_avg_lpdiff(points: list[dict]) -> None:
-    win_lp_diffs = deque(maxlen=config.LPDIFF_WINDOW)
-    loss_lp_diffs = deque(maxlen=config.LPDIFF_WINDOW)
-
-    logger.info("Calculating rolling average LP diff...")
-    for point in points:
-        if point["lp_diff"] is not None:
-            lp_diff = abs(point["lp_diff"])
-            if lp_diff > 10 and lp_diff < 100:
-                if point["result"] == "WON":
-                    win_lp_diffs.append(lp_diff)
-                elif point["result"] == "LOST":
-                    loss_lp_diffs.append(lp_diff)
-
-        # Calculate rolling average for wins if we have enough data points
-        if (
-            len(win_lp_diffs) == config.LPDIFF_WINDOW
-            and len(loss_lp_diffs) == config.LPDIFF_WINDOW
-        ):
-            avg_win = sum(win_lp_diffs) / config.LPDIFF_WINDOW
-            avg_loss = sum(loss_lp_diffs) / config.LPDIFF_WINDOW
-            point["roll_avg_lpdiff"] = avg_win - avg_loss
-        else:
-            point["roll_avg_lpdiff"] = None
+def min_max_decimate(y: np.ndarray, start: int, stop: int, columns: int) -> np.ndarray:
+    """
+    Returns the indices of a shape preserving subset of y[start:stop] to draw in the given
+    number of pixel columns: the first, lowest, highest and last point of each column.
+    Returns every index if there are at most 4 points per column.
+    """
+    n = stop - start
+    if n <= 4 * columns:
+        return np.arange(start, stop)
+
+    segment = y[start:stop]
+    bucket = -(-n // columns)  # points per column, rounded up
+    n_full = n // bucket * bucket
+    buckets = segment[:n_full].reshape(-1, bucket)
+    offsets = np.arange(0, n_full, bucket)
+    indices = [
+        offsets,
+        offsets + buckets.argmin(axis=1),
+        offsets + buckets.argmax(axis=1),
+        offsets + bucket - 1,
+    ]
+    if n_full < n:  # the last column has fewer points
+        rest = segment[n_full:]
+        indices.append([n_full, n_full + rest.argmin(), n_full + rest.argmax(), n - 1])
+
+    return start + np.unique(np.concatenate(indices))
 
 
-def insert_roll_avg_wr(points: list[dict]) -> None:
-    winrates = deque(maxlen=config.WR_WINDOW)
+class LevelOfDetail:
+    """
+    Keeps a line showing a min/max decimated subset of the points in view, so that
+    drawing stays fast for long histories. The subset is recomputed whenever the x-limits
+    or the size of the axes change, down to every point once they fit in the view.
+    """
 
-    logger.info("Calculating rolling average winrate...")
-    for point in points:
-        if point["result"] is not None:
-            if point["result"] == "WON":
-                winrates.append(1)
-            elif point["result"] == "LOST":
-                winrates.append(0)
+    def __init__(self, ax, line, points: data.Points):
+        self.ax = ax
+        self.line = line
+        self.points = points
+        ax.callbacks.connect("xlim_changed", self.update)
+        ax.figure.canvas.mpl_connect("resize_event", self.update)
+        self.update()
 
-        # Calculate rolling average for wins if we have enough data points
-        if len(winrates) == config.WR_WINDOW:
-            avg_winrate = sum(winrates) / config.WR_WINDOW
-            point["roll_avg_wr"] = avg_winrate
-        else:
-            point["roll_avg_wr"] = None
+    def update(self, *_):
+        n = len(self.points)
+        low, high = sorted(self.ax.get_xlim())
+        # x is the number of games ago, so index i is at x = n - 1 - i. One point on
+        # each side of the view is kept so that the line reaches the edges.
+        start = min(max(0, n - 2 - math.ceil(high)), n)
+        stop = max(0, min(n, n + 1 - math.floor(low)))
+        columns = max(1, int(self.ax.bbox.width))
 
+        indices = min_max_decimate(self.points.y, start, stop, columns)
+        self.line.set_data(self.points.x[indices], self.points.y[indices])
 
-def on_key(event, r_avg_lpdiff, r_avg_wr):
+
+def set_roll_avg_lines(points: data.Points, r_avg_lpdiff, r_avg_wr) -> None:
+    """
+    Sets the data, labels and limits of the rolling average axes from the rolling
+    averages currently stored in points.
+    """
+    lpdiff = points.roll_avg_lpdiff
+    r_avg_lpdiff.get_lines()[0].set_data(points.x, lpdiff)
+    r_avg_lpdiff.set_ylabel(
+        f"Rolling Average LP Difference [window={points.lpdiff_window}]",
+        color="white",
+    )
+    OFFSET = 2  # Offset for the y-axis limits
+    filtered_diff = lpdiff[~np.isnan(lpdiff)]
+    max_diff = np.abs(filtered_diff).max() if len(filtered_diff) > 0 else 0
+    r_avg_lpdiff.set_ylim(-max_diff - OFFSET, max_diff + OFFSET)
+
+    winrates = points.roll_avg_wr[~np.isnan(points.roll_avg_wr)]
+    window_size = 3  # Adjust this as needed
+    smoothed_winrates = (
+        np.convolve(winrates, np.ones(window_size) / window_size, mode="valid")
+        if len(winrates) > 0
+        else winrates
+    )
+    x_values = points.x[len(points) - len(smoothed_winrates) :]
+    r_avg_wr.get_lines()[0].set_data(x_values, smoothed_winrates)
+    r_avg_wr.set_ylabel(
+        f"Rolling average winrate [window={points.wr_window}]", color="white"
+    )
+
+
+def resize_roll_avg_windows(
+    points: data.Points, r_avg_lpdiff, r_avg_wr, step: int
+) -> None:
+    """
+    Grows (or shrinks for a negative step) the window of the visible rolling averages,
+    or of both if neither is visible, and recomputes them in place.
+    """
+    resize_lpdiff = r_avg_lpdiff.get_visible() or not r_avg_wr.get_visible()
+    resize_wr = r_avg_wr.get_visible() or not r_avg_lpdiff.get_visible()
+
+    if resize_lpdiff:
+        data.insert_roll_avg_lpdiff(points, max(1, points.lpdiff_window + step))
+    if resize_wr:
+        data.insert_roll_avg_wr(points, max(1, points.wr_window + step))
+    logger.info(
+        f"Rolling windows: LP diff {points.lpdiff_window}, winrate {points.wr_window}"
+    )
+    set_roll_avg_lines(points, r_avg_lpdiff, r_avg_wr)
+
+
+def on_key(event, points: data.Points, r_avg_lpdiff, r_avg_wr):
     if event.key == "l":  # Replace 't' with the key you want to use
         line_visibility = r_avg_lpdiff.get_lines()[0].get_visible()
         axis_visibility = r_avg_lpdiff.axes.get_visible()
@@ -208,152 +238,261 @@ def on_key(event, r_avg_lpdiff, r_avg_wr):
         r_avg_wr.get_lines()[0].set_visible(not line_visibility)
         r_avg_wr.axes.set_visible(not axis_visibility)
         plt.draw()
+    elif event.key in ("+", "="):
+        resize_roll_avg_windows(points, r_avg_lpdiff, r_avg_wr, config.WINDOW_STEP)
+        plt.draw()
+    elif event.key == "-":
+        resize_roll_avg_windows(points, r_avg_lpdiff, r_avg_wr, -config.WINDOW_STEP)
+        plt.draw()
 
 
-def plot(
-    summoner_name: str, region: str, pages: list[dict], thresholds: list[dict]
-) -> str:
+class LPPlot:
     """
-    Plots the data. Returns a message to display after plotting.
+    The figure of a player's LP history, holding the artists and the interactive
+    helpers that update them. The helpers are only referenced weakly by matplotlib's
+    callbacks, so an LPPlot has to be kept alive as long as its figure is shown.
     """
-    logger.info("Extracting points...")
-    points = extract_points(pages)
-    logger.info(f"Found {len(points)} points")
-
-    if len(points) == 0:
-        msg = "No games found."
-        logger.info(msg)
-        return msg
-
-    logger.info("Filling in x values...")
-    for i, point in enumerate(reversed(points)):
-        point["x"] = i
-
-    x_values = [point["x"] for point in points]
-    y_values = [point["y"] for point in points]
 
-    plt.rcParams["keymap.yscale"].remove("l")
-
-    fig, ax = plt.subplots(constrained_layout=True)
-    (line,) = ax.plot(x_values, y_values, color="#E8E8E8", linewidth=0.7)
-    ax.set_facecolor("#343541")
-    fig.patch.set_facecolor("#343541")
-
-    manager = plt.get_current_fig_manager()
-    if manager is not None:
-        # TODO: handle other backends
-        from PyQt5 import QtGui
+    def __init__(
+        self,
+        summoner_name: str,
+        region: str,
+        points: data.Points,
+        thresholds: list[dict],
+        interactive=True,
+    ):
+        self.summoner_name = summoner_name
+        self.region = region
+        self.points = points
+        self.thresholds = thresholds
+        self.rank_scale = data.RankScale(thresholds)
+
+        if "l" in plt.rcParams["keymap.yscale"]:
+            plt.rcParams["keymap.yscale"].remove("l")
+
+        fig, ax = plt.subplots(constrained_layout=True)
+        (line,) = ax.plot(points.x, points.y, color="#E8E8E8", linewidth=0.7)
+        ax.set_facecolor("#343541")
+        fig.patch.set_facecolor("#343541")
+        self.fig, self.ax, self.line = fig, ax, line
+
+        manager = plt.get_current_fig_manager() if interactive else None
+        if manager is not None:
+            # TODO: handle other backends
+            from PyQt5 import QtGui
+
+            logger.info(f"Manager {manager} found, setting window title and icon...")
+            manager.set_window_title(f"LP History - {summoner_name} ({region})")
+            manager.window.setWindowIcon(QtGui.QIcon(config.ICON_PATH))  # type: ignore
+
+        ax.yaxis.set_major_formatter(
+            FuncFormatter(lambda y, pos: self.rank_scale.label(y))
+        )
+        ax.yaxis.set_minor_formatter(
+            FuncFormatter(
+                lambda y, pos: self.rank_scale.label(y, minor_tick=True),
+            )
+        )
+        ax.invert_xaxis()
+        self.level_of_detail = LevelOfDetail(ax, line, points)
+        ax.tick_params(
+            which="both", color="white", labelcolor="white", length=0, width=0
+        )
 
-        logger.info(f"Manager {manager} found, setting window title and icon...")
-        manager.set_window_title(f"LP History - {summoner_name} ({region})")
-        manager.window.setWindowIcon(QtGui.QIcon(config.ICON_PATH))  # type: ignore
+        self.rank_spans = []
+        self.set_rank_axis()
 
-    Y_AXIS_PADDING = 10
-    y_axis_min = min(y_values) - Y_AXIS_PADDING
-    y_axis_max = max(y_values) + Y_AXIS_PADDING
+        logger.info("Inserting patch lines...")
+        self.patch_artists = []
+        insert_patch_lines(points, ax, artists=self.patch_artists)
 
-    ax.set_ylim(y_axis_min, y_axis_max)
-    ax.yaxis.set_major_formatter(
-        FuncFormatter(lambda y, pos: data.value_to_rank(y, pos, thresholds))
-    )
-    ax.yaxis.set_minor_formatter(
-        FuncFormatter(
-            lambda y, pos: data.value_to_rank(y, pos, thresholds, minor_tick=True),
+        plt.grid(
+            which="major", linestyle="-", linewidth="0.35", color="black", axis="y"
+        )
+        plt.grid(which="minor", linestyle="-", linewidth="0.35", color="black")
+
+        self.crosshair = None
+        if interactive:  # the cursor is only useful in a window
+            self.crosshair = cursor.Cursor(
+                ax,
+                line,
+                points,
+                lambda y: self.rank_scale.label(y, short=True, show_lp=True),
+            )
+            fig.canvas.mpl_connect("motion_notify_event", self.crosshair.on_mouse_move)
+
+        # Create secondary y-axis for the rolling average difference
+        ax2 = ax.twinx()
+        ax2.plot([], [], "black", linewidth=0.5, visible=False)
+        ax2.tick_params(axis="y", labelcolor="white")
+        ax2.axhline(y=0, color="black", linewidth=2)
+        ax2.set_visible(False)
+
+        ax3 = ax.twinx()
+        ax3.spines["right"].set_position(("outward", 60))  # Offset the right spine
+        ax3.spines["right"].set_color("white")
+        ax3.tick_params(axis="y", labelcolor="white")
+        ax3.plot([], [], "black", linewidth=0.5, visible=False)
+        ax3.set_ylim(0, 1)
+        ax3.axhline(y=0.5, color="black", linewidth=2)
+        ax3.set_visible(False)
+        self.ax2, self.ax3 = ax2, ax3
+
+        set_roll_avg_lines(points, ax2, ax3)
+
+        fig.canvas.mpl_connect(
+            "key_press_event", lambda event: on_key(event, points, ax2, ax3)
         )
-    )
-    ax.invert_xaxis()
-
-    TICK_LP_INTERVAL = 200
-    logger.info("Setting ticks...")
-    major_ticks = get_major_ticks(y_values, thresholds)
-    minor_ticks = [
-        value
-        for value in range(min(y_values), max(y_values))
-        if value % TICK_LP_INTERVAL == 0
-    ]
 
-    ax.yaxis.set_ticks(minor_ticks, minor=True)  # Set minor ticks
-    ax.yaxis.set_ticks(major_ticks)
-    ax.tick_params(which="both", color="white", labelcolor="white", length=0, width=0)
+        # Set the title and x-axis label
+        ax.set_xlabel("Games Ago", color="white")
+        ax.set_ylabel("Rank", color="white")
+        self.set_title()
+
+    def set_rank_axis(self) -> None:
+        """
+        Fits the y-axis to the points, and sets its ticks and the rank colors.
+        """
+        y_values = self.points.y
+        Y_AXIS_PADDING = 10
+        y_axis_min = y_values.min() - Y_AXIS_PADDING
+        y_axis_max = y_values.max() + Y_AXIS_PADDING
+        self.ax.set_ylim(y_axis_min, y_axis_max)
+
+        TICK_LP_INTERVAL = 200
+        logger.info("Setting ticks...")
+        major_ticks = get_major_ticks(y_values, self.thresholds)
+        minor_ticks = [
+            value
+            for value in range(y_values.min(), y_values.max())
+            if value % TICK_LP_INTERVAL == 0
+        ]
+
+        self.ax.yaxis.set_ticks(minor_ticks, minor=True)  # Set minor ticks
+        self.ax.yaxis.set_ticks(major_ticks)
+
+        logger.info("Coloring rank intervals...")
+        for span in self.rank_spans:
+            span.remove()
+        self.rank_spans = color_rank_intervals(
+            self.thresholds, y_axis_min, y_axis_max, self.ax
+        )
 
-    logger.info("Inserting patch lines...")
-    insert_patch_lines(points, ax)
+    def set_title(self) -> None:
+        points = self.points
+        peak = int(np.argmax(points.y))
+
+        title = (
+            "LP History - [{}] - [{}]\nPeak: {} at {} patch {} ({} games ago)".format(
+                self.summoner_name,
+                self.region,
+                self.rank_scale.label(points.y[peak], short=True, show_lp=True),
+                points.date(peak).strftime("%b %d"),
+                points.patch(peak),
+                len(points) - 1 - peak,
+            )
+        )
+        self.ax.set_title(title, color="white")
+
+    def append(
+        self, new_points: data.Points, thresholds: list[dict] | None = None
+    ) -> int:
+        """
+        Appends points that were all played after the plotted games to the figure,
+        without rebuilding it. Pass the merged thresholds if the new games brought new
+        ones. Returns the number of games added.
+        """
+        if len(new_points) == 0 and thresholds is None:
+            return 0
+
+        points = self.points
+        points.extend(new_points)
+        data.insert_roll_avg_lpdiff(points, points.lpdiff_window)
+        data.insert_roll_avg_wr(points, points.wr_window)
+        set_roll_avg_lines(points, self.ax2, self.ax3)
+
+        if thresholds is not None:
+            self.thresholds = thresholds
+            self.rank_scale = data.RankScale(thresholds)
+        self.set_rank_axis()
+
+        # Every game moved one game further back for each new game
+        for artist in self.patch_artists:
+            artist.remove()
+        self.patch_artists = []
+        insert_patch_lines(points, self.ax, artists=self.patch_artists)
+
+        if self.ax.get_autoscalex_on():  # not zoomed in, so show the new games too
+            margin = self.ax.margins()[0] * max(1, len(points) - 1)
+            self.ax.set_xlim(len(points) - 1 + margin, -margin)
+            self.ax.set_autoscalex_on(True)
+        self.level_of_detail.update()
+
+        if self.crosshair is not None:
+            self.crosshair.invalidate()
+        self.set_title()
+        self.fig.canvas.draw_idle()
+        return len(new_points)
+
+    def save(self, output: str) -> None:
+        """
+        Saves the figure to output, in the format given by its extension, and closes it.
+        """
+        logger.info(f"Saving plot to {output}...")
+        self.fig.savefig(output, facecolor=self.fig.get_facecolor())
+        plt.close(self.fig)
+
+
+def make_plot(
+    summoner_name: str,
+    region: str,
+    points: data.Points,
+    thresholds: list[dict],
+    interactive=True,
+) -> LPPlot | None:
+    """
+    Builds the figure of the points without showing it. Returns None if there are no
+    ranked games to plot.
+    """
+    logger.info(f"Plotting {len(points)} points")
 
-    plt.grid(which="major", linestyle="-", linewidth="0.35", color="black", axis="y")
-    plt.grid(which="minor", linestyle="-", linewidth="0.35", color="black")
+    if len(points) == 0:
+        return None
 
     # Calculate the rolling averages
-    insert_roll_avg_lpdiff(points)
-    insert_roll_avg_wr(points)
-
-    crosshair = cursor.Cursor(
-        ax,
-        line,
-        points,
-        lambda y: data.value_to_rank(y, None, thresholds, short=True, show_lp=True),
-    )
-    fig.canvas.mpl_connect("motion_notify_event", crosshair.on_mouse_move)
+    with profiling.stage("rolling_averages"):
+        data.insert_roll_avg_lpdiff(points)
+        data.insert_roll_avg_wr(points)
 
-    logger.info("Coloring rank intervals...")
-    color_rank_intervals(thresholds, y_axis_min, y_axis_max)
+    with profiling.stage("build_figure"):
+        return LPPlot(summoner_name, region, points, thresholds, interactive)
 
-    peak = max(points, key=lambda x: x["y"])
 
-    title = "LP History - [{}] - [{}]\nPeak: {} at {} patch {} ({} games ago)".format(
-        summoner_name,
-        region,
-        data.value_to_rank(peak["y"], None, thresholds, short=True, show_lp=True),
-        peak["date"].strftime("%b %d"),
-        peak["patch"],
-        peak["x"],
-    )
-
-    r_avg_lpdiff = [point["roll_avg_lpdiff"] for point in points]
-    r_avg_wr = [point["roll_avg_wr"] for point in points if point["roll_avg_wr"]]
-
-    # Create secondary y-axis for the rolling average difference
-    ax2 = ax.twinx()
-    ax2.plot(x_values, r_avg_lpdiff, "black", linewidth=0.5, visible=False)
-    ax2.set_ylabel(
-        f"Rolling Average LP Difference [window={config.LPDIFF_WINDOW}]", color="white"
-    )
-    ax2.tick_params(axis="y", labelcolor="white")
-    ax2.axhline(y=0, color="black", linewidth=2)
-    ax2.set_visible(False)
-
-    OFFSET = 2  # Offset for the y-axis limits
-    filtered_diff = [val for val in r_avg_lpdiff if val is not None]
-    max_diff = max(abs(min(filtered_diff)), max(filtered_diff)) if filtered_diff else 0
-    ax2.set_ylim(-max_diff - OFFSET, max_diff + OFFSET)
-
-    window_size = 3  # Adjust this as needed
-    smoothed_r_avg_wr = (
-        np.convolve(r_avg_wr, np.ones(window_size) / window_size, mode="valid")
-        if len(r_avg_wr) > 0
-        else r_avg_wr
-    )
-    adjusted_x_values = x_values[len(x_values) - len(smoothed_r_avg_wr) :]
-
-    ax3 = ax.twinx()
-    ax3.spines["right"].set_position(("outward", 60))  # Offset the right spine of ax3
-    ax3.spines["right"].set_color("white")
-    ax3.tick_params(axis="y", labelcolor="white")
-    ax3.plot(
-        adjusted_x_values, smoothed_r_avg_wr, "black", linewidth=0.5, visible=False
-    )
-    ax3.set_ylabel(
-        f"Rolling average winrate [window={config.WR_WINDOW}]", color="white"
+def plot(
+    summoner_name: str,
+    region: str,
+    points: data.Points,
+    thresholds: list[dict],
+    output: str | None = None,
+) -> str:
+    """
+    Plots the data. If output is a path, the plot is saved there (in the format given by
+    its extension) instead of being shown, which requires the Agg backend to have been
+    selected before this module was imported. Returns a message to display after
+    plotting.
+    """
+    lp_plot = make_plot(
+        summoner_name, region, points, thresholds, interactive=output is None
     )
-    ax3.set_ylim(0, 1)
-    ax3.axhline(y=0.5, color="black", linewidth=2)
-    ax3.set_visible(False)
-
-    fig.canvas.mpl_connect("key_press_event", lambda event: on_key(event, ax2, ax3))
+    if lp_plot is None:
+        msg = "No games found."
+        logger.info(msg)
+        return msg
 
-    # Set the title and x-axis label
-    ax.set_xlabel("Games Ago", color="white")
-    ax.set_ylabel("Rank", color="white")
-    ax.set_title(title, color="white")
+    if output is not None:
+        with profiling.stage("save"):
+            lp_plot.save(output)
+        return f"Saved plot to {output}"
 
     plt.show()
 
@@ -0,0 +1,100 @@
+"""
+Measures the wall and CPU time of each stage of a run for --profile. Nothing is
+recorded until start() is called, so the stages cost nothing in normal runs.
+"""
+
+import atexit
+import contextlib
+import json
+import sys
+import time
+
+__all__ = ["start", "stage", "stages", "format_report"]
+
+_stages: list[dict] | None = None
+_depth = 0
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """
+    Records the wall and CPU time spent in the block as a stage. Stages can be nested,
+    in which case they are reported below the stage they are part of. CPU time is the
+    time of the whole process, so it includes other threads.
+    """
+    global _depth
+    if _stages is None:
+        yield
+        return
+
+    record = {"stage": name, "depth": _depth}
+    _stages.append(record)  # before running, so nested stages come after their parent
+    wall, cpu = time.perf_counter(), time.process_time()
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        record["wall"] = time.perf_counter() - wall
+        record["cpu"] = time.process_time() - cpu
+
+
+def stages() -> list[dict]:
+    """
+    Returns the recorded stages in the order they were started.
+    """
+    return list(_stages or [])
+
+
+def format_report() -> str:
+    """
+    Formats the recorded stages as a table, with nested stages indented below their
+    parent and the total of the top level stages at the end.
+    """
+    rows = [
+        ("  " * record["depth"] + record["stage"], record["wall"], record["cpu"])
+        for record in stages()
+        if "wall" in record
+    ]
+    top_level = [record for record in stages() if record["depth"] == 0]
+    rows.append(
+        (
+            "total",
+            sum(record.get("wall", 0) for record in top_level),
+            sum(record.get("cpu", 0) for record in top_level),
+        )
+    )
+
+    width = max(len(name) for name, _, _ in rows + [("stage", 0, 0)])
+    lines = [f"{'stage':<{width}}{'wall':>12}{'cpu':>12}"]
+    for name, wall, cpu in rows:
+        lines.append(f"{name:<{width}}{wall * 1000:>10.1f}ms{cpu * 1000:>10.1f}ms")
+    return "\n".join(lines)
+
+
+def start(json_path: str | None = None, dump_path: str | None = None) -> None:
+    """
+    Starts recording stages. At exit, the report is printed to stderr, and also written
+    as JSON to json_path if set. If dump_path is set, the whole run is also profiled
+    with cProfile and its stats are dumped there, to be read with pstats or snakeviz.
+    """
+    global _stages
+    _stages = []
+
+    profiler = None
+    if dump_path is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def finish():
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(dump_path)
+        print(format_report(), file=sys.stderr)
+        if json_path is not None:
+            with open(json_path, "w") as file:
+                json.dump(stages(), file, indent=2)
+
+    atexit.register(finish)
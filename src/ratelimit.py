@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+__all__ = ["TokenBucket"]
+
+
+class TokenBucket:
+    """
+    A token bucket rate limiter for coroutines on a single event loop, allowing bursts of
+    up to `capacity` requests and `rate` requests per second after that. Implemented as
+    GCRA, which only has to track the time at which the next request is allowed.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.interval = 1 / rate
+        self.tolerance = (capacity - 1) * self.interval
+        self._next_allowed = 0.0  # theoretical arrival time of the next request
+
+    async def acquire(self) -> None:
+        """
+        Waits until a request may be sent. The slot is reserved before waiting, so
+        concurrent callers are spaced out instead of waking up at the same time.
+        """
+        now = time.monotonic()
+        next_allowed = max(self._next_allowed, now)
+        self._next_allowed = next_allowed + self.interval
+        wait = next_allowed - self.tolerance - now
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Blocks all requests for the given number of seconds, e.g. when the server asks us
+        to back off with a 429 response.
+        """
+        self._next_allowed = max(
+            self._next_allowed, time.monotonic() + seconds + self.tolerance
+        )
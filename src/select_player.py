@@ -2,16 +2,34 @@ import json
 import subprocess
 import urllib.parse as urllib
 
+import src.cache as cache
 import src.config as config
 from src.util import transform_riot_id
 
-__all__ = ["select_player"]
+__all__ = ["select_player", "get_players"]
 
 
-def get_opgg_urls() -> list[tuple[str, str]]:
+def find_folder(node: dict, name: str) -> dict | None:
     """
-    Get all op.gg urls from the bookmarks file with the bookmark name as the first element
-    and the url as the second element
+    Returns the first bookmark folder called name below node, searching depth first.
+    """
+    for child in node.get("children", []):
+        if child.get("type", "folder") != "folder":
+            continue
+        if child["name"] == name:
+            return child
+        found = find_folder(child, name)
+        if found is not None:
+            return found
+    return None
+
+
+def get_opgg_urls(folder: str = config.BOOKMARKS_FOLDER) -> list[tuple[str, str]]:
+    """
+    Get all op.gg urls from a bookmark folder and its subfolders, with the bookmark name
+    as the first element and the url as the second element. Bookmarks in subfolders are
+    named after their path below the folder, e.g. "team/Faker". Throws ValueError if
+    there is no such folder.
     """
 
     def strip_query_params(url):
@@ -23,14 +41,22 @@ def get_opgg_urls() -> list[tuple[str, str]]:
 
         return new_url
 
+    def collect(node: dict, prefix: str):
+        for child in node.get("children", []):
+            if "children" in child:
+                collect(child, f"{prefix}{child['name']}/")
+            elif "url" in child:
+                name = prefix + child["name"]
+                opgg_urls.append((name, strip_query_params(child["url"])))
+
     with open(config.BOOKMARKS_FILE, "r") as file:
         bookmarks = json.load(file)
 
+    root = find_folder({"children": list(bookmarks["roots"].values())}, folder)
+    if root is None:
+        raise ValueError(f"No bookmark folder named {folder!r}")
     opgg_urls = []
-    for root in bookmarks["roots"]["bookmark_bar"]["children"]:
-        if root["name"] == "opgg":
-            for child in root["children"]:
-                opgg_urls.append((child["name"], strip_query_params(child["url"])))
+    collect(root, "")
 
     return [
         url
@@ -64,13 +90,28 @@ def parse_url(url: str) -> tuple[str, str]:
     return (transform_riot_id(riot_id, region), region.upper())
 
 
-def select_player() -> tuple[str, str]:
-    players = []
-    urls = get_opgg_urls()
-    for url in urls:
-        bookmark_name = url[0]
-        riot_id, region = parse_url(url[1])
-        players.append({"title": bookmark_name, "riot_id": riot_id, "region": region})
+def get_players(folder: str = config.BOOKMARKS_FOLDER) -> list[tuple[str, str, str]]:
+    """
+    Returns the bookmark name, riot ID and region of every player bookmarked in a
+    folder. The players are cached until the bookmarks file changes, so that the
+    bookmarks only have to be parsed again after an edit.
+    """
+    key = cache.bookmarks_key(config.BOOKMARKS_FILE, folder)
+    players = cache.load_bookmarked_players(key)
+    if players is None:
+        players = [
+            (bookmark_name, *parse_url(url))
+            for bookmark_name, url in get_opgg_urls(folder)
+        ]
+        cache.save_bookmarked_players(key, players)
+    return players
+
+
+def select_player(folder: str = config.BOOKMARKS_FOLDER) -> tuple[str, str]:
+    players = [
+        {"title": bookmark_name, "riot_id": riot_id, "region": region}
+        for bookmark_name, riot_id, region in get_players(folder)
+    ]
 
     input_str = "\n".join(
         [
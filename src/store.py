@@ -0,0 +1,237 @@
+import contextlib
+import datetime
+import logging
+import os
+import sqlite3
+
+import numpy as np
+
+import src.config as config
+import src.data_processing as data
+
+__all__ = ["load_history", "save_history", "newest", "patch_key"]
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    riot_id TEXT NOT NULL,
+    region TEXT NOT NULL,
+    newest INTEGER,  -- start time of the newest game, placements included
+    UNIQUE (riot_id, region)
+);
+CREATE TABLE IF NOT EXISTS games (
+    player_id INTEGER NOT NULL REFERENCES players (id),
+    started_at INTEGER NOT NULL,
+    y INTEGER NOT NULL,  -- see data.get_y
+    result INTEGER NOT NULL,  -- one of the data.RESULT_* codes
+    lp_diff INTEGER,  -- NULL where unknown
+    patch TEXT NOT NULL,
+    patch_key INTEGER NOT NULL,  -- patch_key(patch), for patch ranges
+    PRIMARY KEY (player_id, started_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS games_patch ON games (player_id, patch_key);
+CREATE TABLE IF NOT EXISTS thresholds (
+    player_id INTEGER NOT NULL REFERENCES players (id),
+    season INTEGER NOT NULL,  -- of the games on the page the threshold came from
+    tier TEXT NOT NULL,
+    division TEXT,
+    min_value INTEGER NOT NULL,
+    max_value INTEGER NOT NULL,
+    PRIMARY KEY (player_id, season, tier, division)
+);
+"""
+
+# The columns of the games read into a NumPy array, see load_history
+GAME_DTYPE = np.dtype(
+    [
+        ("started_at", np.int64),
+        ("y", np.int32),
+        ("result", np.int8),
+        ("lp_diff", np.float32),
+        ("lp_diff_unknown", np.bool_),
+        ("patch", "U16"),
+    ]
+)
+
+
+def patch_key(patch: str) -> int:
+    """
+    Returns a number that sorts patches in release order, e.g. 14.2 before 14.10.
+    """
+    major, minor = (patch.split(".") + ["0"])[:2]
+    return int(major) * 1000 + int(minor)
+
+
+@contextlib.contextmanager
+def _connect(path: str | None = None):
+    """
+    Opens the store, creating it if needed, and commits the changes made through the
+    connection unless an exception is raised.
+    """
+    path = path or config.STORE_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=10)
+    try:
+        connection.executescript(SCHEMA)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def _player_id(connection, riot_id: str, region: str) -> int | None:
+    row = connection.execute(
+        "SELECT id FROM players WHERE riot_id = ? AND region = ?",
+        (riot_id, region.upper()),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def newest(riot_id: str, region: str) -> int | None:
+    """
+    Returns the start time of the newest stored game of a player, or None if the player
+    has no stored games.
+    """
+    with _connect() as connection:
+        row = connection.execute(
+            "SELECT newest FROM players WHERE riot_id = ? AND region = ?",
+            (riot_id, region.upper()),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def save_history(
+    riot_id: str, region: str, history: data.History, replace=False
+) -> None:
+    """
+    Stores the games and thresholds of a history, keeping the games that are already
+    stored and filing the thresholds by season. Set replace=True to delete the stored
+    games and thresholds of the player first.
+    """
+    points = history.points
+    logger.info(f"Storing {len(points)} games for {riot_id}")
+    with _connect() as connection:
+        connection.execute(
+            "INSERT INTO players (riot_id, region, newest) VALUES (?, ?, ?) "
+            "ON CONFLICT (riot_id, region) DO UPDATE SET newest = MAX("
+            "COALESCE(newest, excluded.newest), excluded.newest)",
+            (riot_id, region.upper(), history.newest),
+        )
+        player_id = _player_id(connection, riot_id, region)
+        if replace:
+            connection.execute("DELETE FROM games WHERE player_id = ?", (player_id,))
+            connection.execute(
+                "DELETE FROM thresholds WHERE player_id = ?", (player_id,)
+            )
+            connection.execute(
+                "UPDATE players SET newest = ? WHERE id = ?",
+                (history.newest, player_id),
+            )
+
+        patches = [(patch, patch_key(patch)) for patch in points.patches]
+        lp_diffs = points.lp_diffs.astype(object)
+        lp_diffs[np.isnan(points.lp_diffs)] = None
+        connection.executemany(
+            "INSERT OR IGNORE INTO games VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (player_id, started_at, y, result, lp_diff) + patches[code]
+                for started_at, y, result, lp_diff, code in zip(
+                    points.timestamps.tolist(),
+                    points.y.tolist(),
+                    points.results.tolist(),
+                    lp_diffs.tolist(),
+                    points.patch_codes.tolist(),
+                )
+            ),
+        )
+
+        connection.executemany(
+            "INSERT OR REPLACE INTO thresholds VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    player_id,
+                    season,
+                    threshold["tier"],
+                    threshold["division"],
+                    threshold["minValue"],
+                    threshold["maxValue"],
+                )
+                for season, thresholds in history.season_thresholds.items()
+                for threshold in thresholds
+            ),
+        )
+
+
+def load_history(
+    riot_id: str,
+    region: str,
+    last_games: int | None = None,
+    since: datetime.datetime | None = None,
+    patches: tuple[str | None, str | None] = (None, None),
+) -> data.History | None:
+    """
+    Returns the stored history of a player, or None if the player is not stored. The
+    games can be limited to the last_games most recent ones, to the ones played since a
+    date, and to a range of patches (both ends included, None for an open end). The
+    rows are read straight into NumPy arrays.
+    """
+    conditions, parameters = [], []
+    if since is not None:
+        conditions.append("started_at >= ?")
+        parameters.append(int(since.timestamp()))
+    if patches[0] is not None:
+        conditions.append("patch_key >= ?")
+        parameters.append(patch_key(patches[0]))
+    if patches[1] is not None:
+        conditions.append("patch_key <= ?")
+        parameters.append(patch_key(patches[1]))
+    where = "".join(f" AND {condition}" for condition in conditions)
+    limit = f" LIMIT {int(last_games)}" if last_games is not None else ""
+
+    with _connect() as connection:
+        row = connection.execute(
+            "SELECT id, newest FROM players WHERE riot_id = ? AND region = ?",
+            (riot_id, region.upper()),
+        ).fetchone()
+        if row is None:
+            return None
+        player_id, newest_game = row
+
+        rows = connection.execute(
+            "SELECT started_at, y, result, COALESCE(lp_diff, 0), "
+            "lp_diff IS NULL, patch FROM games "
+            f"WHERE player_id = ?{where} ORDER BY started_at DESC{limit}",
+            [player_id] + parameters,
+        )
+        games = np.fromiter(rows, dtype=GAME_DTYPE)[::-1]  # oldest first
+
+        season_thresholds: dict[int, list[dict]] = {}
+        for season, tier, division, min_value, max_value in connection.execute(
+            "SELECT season, tier, division, min_value, max_value FROM thresholds "
+            "WHERE player_id = ? ORDER BY season DESC, min_value",
+            (player_id,),
+        ):
+            season_thresholds.setdefault(season, []).append(
+                {
+                    "tier": tier,
+                    "division": division,
+                    "minValue": min_value,
+                    "maxValue": max_value,
+                }
+            )
+
+    patches_table, patch_codes = np.unique(games["patch"], return_inverse=True)
+    lp_diffs = games["lp_diff"].copy()
+    lp_diffs[games["lp_diff_unknown"]] = np.nan
+    points = data.Points(
+        timestamps=games["started_at"].copy(),
+        y=games["y"].copy(),
+        results=games["result"].copy(),
+        lp_diffs=lp_diffs,
+        patch_codes=patch_codes.astype(np.int16),
+        patches=[str(patch) for patch in patches_table],
+    )
+    thresholds = data.unique_thresholds(list(season_thresholds.values()))
+    return data.History(points, thresholds, newest_game, season_thresholds)
@@ -7,24 +7,9 @@ def short_tier(tier: str) -> str:
 
 
 def notif(message: str, duration: int = 999999999):
-    import subprocess
-
-    ID = "938104"
-    subprocess.Popen(
-        [
-            "notify-send",
-            "-t",
-            str(duration),
-            "-u",
-            "low",
-            "-c",
-            "no_title",
-            " ",
-            message,
-            "-r",
-            ID,
-        ]
-    )
+    import src.notifications as notifications
+
+    notifications.send(message, duration)
 
 
 def transform_riot_id(riot_id: str, region: str) -> str:
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import queue
+import threading
+
+import aiohttp
+import matplotlib.pyplot as plt
+
+import src.api as api
+import src.config as config
+import src.data_processing as data
+import src.pagesize as pagesize
+import src.plot as plot
+import src.store as store
+
+__all__ = ["Watcher", "watch"]
+
+logger = logging.getLogger(__name__)
+
+
+class Watcher:
+    """
+    Polls the first page of a player's history in a background thread, and appends the
+    games played since the last poll to an open plot of the history. Older pages are
+    only fetched if every game of the first page is new. The plot and the history are
+    only touched from the GUI thread, by a timer that picks up what the poller found.
+    """
+
+    def __init__(
+        self,
+        lp_plot: plot.LPPlot,
+        riot_id: str,
+        region: str,
+        history: data.History,
+        interval: float = config.WATCH_INTERVAL,
+        page_size: int | str = config.PAGE_SIZE,
+    ):
+        self.lp_plot = lp_plot
+        self.riot_id = riot_id
+        self.region = region
+        self.history = history  # its points are the points of the plot
+        self.interval = interval
+        self.sizer = pagesize.get(page_size, region)
+        self.newest = history.newest
+        self.thresholds = history.thresholds
+        # New games are only stored if the store holds every game before them, which
+        # is not the case for a partial fetch with last_games or since
+        self.store = history.newest is not None and (
+            store.newest(riot_id, region) == history.newest
+        )
+        self.updates: queue.Queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self.run, daemon=True, name="lol-lp-watch"
+        )
+        self._timer = lp_plot.fig.canvas.new_timer(
+            interval=int(config.WATCH_UPDATE_INTERVAL * 1000)
+        )
+        self._timer.add_callback(self.apply_updates)
+
+    def start(self) -> None:
+        logger.info(f"Checking for new games every {self.interval:g}s...")
+        self._thread.start()
+        self._timer.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._timer.stop()
+
+    def run(self) -> None:
+        asyncio.run(self.poll())
+
+    async def poll(self) -> None:
+        async with aiohttp.ClientSession() as session:
+            semaphore = asyncio.Semaphore(1)
+            while not self._stopped.is_set():
+                try:
+                    new = await api.fetch_new_games(
+                        session,
+                        semaphore,
+                        self.riot_id,
+                        self.region,
+                        self.newest,
+                        sizer=self.sizer,
+                    )
+                    self.add(new)
+                except Exception as e:
+                    logger.warning(f"Could not check for new games: {e}")
+                await asyncio.to_thread(self._stopped.wait, self.interval)
+
+    def add(self, new: data.History) -> None:
+        """
+        Queues the new games for the plot, with the thresholds of the whole history and
+        their merged version if the new games brought new ones.
+        """
+        if new.newest is None:
+            return
+        self.newest = new.newest
+
+        thresholds = data.unique_thresholds([new.thresholds, self.thresholds])
+        merged = None
+        if len(thresholds) > len(self.thresholds):
+            merged = data.merge_thresholds([thresholds], self.region)
+        self.thresholds = thresholds
+        self.updates.put((new, thresholds, merged))
+
+    def apply_updates(self) -> None:
+        while True:
+            try:
+                new, thresholds, merged = self.updates.get_nowait()
+            except queue.Empty:
+                return
+            added = self.lp_plot.append(new.points, merged)
+            self.history.thresholds = thresholds
+            self.history.newest = new.newest
+            if self.store:
+                store.save_history(self.riot_id, self.region, new)
+            logger.info(f"Added {added} new game(s) to the plot")
+
+
+def watch(
+    riot_id: str,
+    region: str,
+    history: data.History,
+    thresholds: list[dict],
+    interval: float = config.WATCH_INTERVAL,
+    page_size: int | str = config.PAGE_SIZE,
+) -> str:
+    """
+    Shows the plot of a player like plot.plot, and keeps adding the player's new games
+    to it until the window is closed, fetching them page_size games per page (see
+    api.get_lphistory). Returns a message to display after plotting.
+    """
+    lp_plot = plot.make_plot(riot_id, region, history.points, thresholds)
+    if lp_plot is None:
+        return "No games found."
+
+    watcher = Watcher(lp_plot, riot_id, region, history, interval, page_size)
+    watcher.start()
+    try:
+        plt.show()
+    finally:
+        watcher.stop()
+
+    return ""